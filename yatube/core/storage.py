@@ -0,0 +1,61 @@
+import gzip
+import os
+
+import brotli
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+# Расширения файлов, которые имеет смысл сжимать заранее.
+COMPRESSIBLE = {
+    '.css', '.js', '.svg', '.ico', '.json', '.txt', '.xml', '.html', '.map',
+}
+
+# Кодировки сжатых копий в порядке предпочтения.
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def compress(content, encoding):
+    if encoding == 'br':
+        return brotli.compress(content, quality=11)
+    return gzip.compress(content, compresslevel=9, mtime=0)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Статика с хэшем содержимого в имени и сжатыми копиями рядом.
+
+    После collectstatic для каждого текстового файла пишутся `.br`
+    и `.gz` — их отдаёт core.views.static_file.
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        # Сжимаются итоговые имена после всех проходов, а не
+        # промежуточные копии CSS.
+        for name, hashed_name in self.hashed_files.items():
+            self.compress_file(name)
+            self.compress_file(hashed_name)
+
+    def compress_file(self, name):
+        if os.path.splitext(name)[1].lower() not in COMPRESSIBLE:
+            return
+        with self.open(name) as file:
+            content = file.read()
+        for encoding, suffix in ENCODINGS:
+            compressed = compress(content, encoding)
+            # Сжатие, которое почти ничего не даёт, не стоит отдельного файла.
+            if len(compressed) >= len(content) * 0.95:
+                continue
+            path = self.path(name) + suffix
+            with open(path, 'wb') as file:
+                file.write(compressed)
+
+    def is_hashed(self, name):
+        """Есть ли в имени файла хэш содержимого из манифеста."""
+        return name in self.hashed_names()
+
+    def hashed_names(self):
+        if getattr(self, '_hashed_names', None) is None:
+            self._hashed_names = set(self.hashed_files.values())
+        return self._hashed_names
@@ -0,0 +1,157 @@
+import gzip
+import os
+import shutil
+import tempfile
+from http import HTTPStatus
+
+import brotli
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.test import Client, RequestFactory, TestCase, override_settings
+
+from core.views import static_file
+
+TEMP_STATIC_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(
+    STATIC_ROOT=TEMP_STATIC_ROOT,
+    STATICFILES_STORAGE='core.storage.CompressedManifestStaticFilesStorage',
+)
+class StaticPipelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with override_settings(
+            STATIC_ROOT=TEMP_STATIC_ROOT,
+            STATICFILES_STORAGE=(
+                'core.storage.CompressedManifestStaticFilesStorage'),
+        ):
+            call_command('collectstatic', interactive=False, verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_STATIC_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.css = staticfiles_storage.stored_name('css/bootstrap.min.css')
+
+    def test_collectstatic_writes_compressed_copies(self):
+        """Текстовые файлы получают хэш в имени и сжатую копию рядом."""
+        self.assertNotEqual(self.css, 'css/bootstrap.min.css')
+        path = os.path.join(TEMP_STATIC_ROOT, self.css)
+        with open(path, 'rb') as file, gzip.open(path + '.gz') as packed:
+            self.assertEqual(packed.read(), file.read())
+        logo = staticfiles_storage.stored_name('img/logo.png')
+        self.assertFalse(
+            os.path.exists(os.path.join(TEMP_STATIC_ROOT, logo + '.gz')))
+
+    def test_hashed_file_is_served_compressed_and_immutable(self):
+        """Хэшированный файл отдаётся сжатым и кэшируется надолго."""
+        request = self.factory.get(
+            '/static/' + self.css, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        response = static_file(request, self.css)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('Accept-Encoding', response['Vary'])
+        response.close()
+
+    def test_brotli_is_preferred(self):
+        """Клиент, который понимает brotli, получает копию .br."""
+        request = self.factory.get(
+            '/static/' + self.css, HTTP_ACCEPT_ENCODING='gzip, br')
+        response = static_file(request, self.css)
+        self.assertEqual(response['Content-Encoding'], 'br')
+        path = os.path.join(TEMP_STATIC_ROOT, self.css)
+        with open(path, 'rb') as file:
+            self.assertEqual(
+                brotli.decompress(b''.join(response.streaming_content)),
+                file.read())
+        response.close()
+
+    def test_plain_file_for_clients_without_compression(self):
+        """Без Accept-Encoding отдаётся исходный файл с коротким кэшем."""
+        request = self.factory.get('/static/css/bootstrap.min.css')
+        response = static_file(request, 'css/bootstrap.min.css')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertNotIn('immutable', response['Cache-Control'])
+        response.close()
+        request = self.factory.get(
+            '/static/css/bootstrap.min.css',
+            HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        response = static_file(request, 'css/bootstrap.min.css')
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class MediaServingTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        os.makedirs(os.path.join(TEMP_MEDIA_ROOT, 'posts'), exist_ok=True)
+        with open(os.path.join(TEMP_MEDIA_ROOT, 'posts', 'a.png'), 'wb') as f:
+            f.write(bytes(range(100)))
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.url = settings.MEDIA_URL + 'posts/a.png'
+
+    def test_file_is_streamed_with_cache_headers(self):
+        """Файл отдаётся целиком с долгим кэшем и поддержкой Range."""
+        response = self.guest_client.get(self.url)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(b''.join(response.streaming_content),
+                         bytes(range(100)))
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('max-age', response['Cache-Control'])
+        response = self.guest_client.get(
+            self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_ranges(self):
+        """Диапазоны байтов отдаются с кодом 206, неверные — 416."""
+        cases = (
+            ('bytes=10-19', 'bytes 10-19/100', bytes(range(10, 20))),
+            ('bytes=95-', 'bytes 95-99/100', bytes(range(95, 100))),
+            ('bytes=-3', 'bytes 97-99/100', bytes(range(97, 100))),
+        )
+        for header, content_range, content in cases:
+            with self.subTest(header=header):
+                response = self.guest_client.get(self.url, HTTP_RANGE=header)
+                self.assertEqual(response.status_code,
+                                 HTTPStatus.PARTIAL_CONTENT)
+                self.assertEqual(response['Content-Range'], content_range)
+                self.assertEqual(b''.join(response.streaming_content),
+                                 content)
+        response = self.guest_client.get(self.url, HTTP_RANGE='bytes=200-')
+        self.assertEqual(response.status_code,
+                         HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+
+    def test_front_proxy_handoff(self):
+        """За nginx приложение только указывает файл в X-Accel-Redirect."""
+        with self.settings(MEDIA_SENDFILE='x-accel-redirect'):
+            response = self.guest_client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'],
+                         settings.MEDIA_ACCEL_PREFIX + 'posts/a.png')
+        self.assertEqual(response.content, b'')
+
+    def test_paths_outside_media_root(self):
+        """Файлы вне MEDIA_ROOT и несуществующие файлы не отдаются."""
+        for path in ('../manage.py', 'posts/missing.png'):
+            with self.subTest(path=path):
+                response = self.guest_client.get(settings.MEDIA_URL + path)
+                self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
@@ -1,4 +1,27 @@
+import mimetypes
+import os
+import posixpath
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import (FileResponse, Http404, HttpResponse,
+                         HttpResponseNotModified)
 from django.shortcuts import render
+from django.utils._os import safe_join
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+from .storage import ENCODINGS
+
+# Хэшированные файлы не меняются никогда: год и immutable.
+HASHED_MAX_AGE = 60 * 60 * 24 * 365
+
+# Один диапазон байтов из заголовка Range; несколько не поддерживаются.
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
 
 
 def page_not_found(request, exception):
@@ -15,3 +38,157 @@ def server_error(request):
 
 def permission_denied(request, exception):
     return render(request, 'core/403.html', status=403)
+
+
+def accepted_encodings(header):
+    """Кодировки из Accept-Encoding, кроме явно запрещённых q=0."""
+    encodings = set()
+    for item in header.split(','):
+        encoding, _, params = item.strip().partition(';')
+        quality = params.strip()
+        if quality.startswith('q='):
+            try:
+                if float(quality[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        encodings.add(encoding.strip().lower())
+    return encodings
+
+
+def resolve(root, path):
+    """Имя и полный путь файла внутри root; 404, если файла нет."""
+    name = posixpath.normpath(path).lstrip('/')
+    try:
+        fullpath = safe_join(root, name)
+    except SuspiciousFileOperation:
+        raise Http404
+    if not os.path.isfile(fullpath):
+        raise Http404
+    return name, fullpath
+
+
+def static_file(request, path):
+    """
+    Собранная статика из STATIC_ROOT для развёртываний без CDN.
+
+    Если клиент принимает br или gzip и рядом лежит сжатая копия,
+    отдаётся она. Файлы с хэшем в имени кэшируются браузером на год.
+    """
+    name, fullpath = resolve(settings.STATIC_ROOT, path)
+    stat = os.stat(fullpath)
+    if not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'),
+                              stat.st_mtime, stat.st_size):
+        return HttpResponseNotModified()
+    content_type = mimetypes.guess_type(fullpath)[0]
+    accepted = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    encoding = None
+    for candidate, suffix in ENCODINGS:
+        if candidate in accepted and os.path.isfile(fullpath + suffix):
+            encoding, fullpath = candidate, fullpath + suffix
+            break
+    response = FileResponse(
+        open(fullpath, 'rb'),
+        content_type=content_type or 'application/octet-stream')
+    if encoding:
+        response['Content-Encoding'] = encoding
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    patch_vary_headers(response, ('Accept-Encoding',))
+    is_hashed = getattr(staticfiles_storage, 'is_hashed', None)
+    if is_hashed is not None and is_hashed(name):
+        patch_cache_control(
+            response, public=True, max_age=HASHED_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(
+            response, public=True, max_age=settings.STATIC_MAX_AGE)
+    return response
+
+
+class FileRange:
+    """Файл, который читается только от start до end включительно."""
+
+    def __init__(self, file, start, end):
+        file.seek(start)
+        self.file = file
+        self.remaining = end - start + 1
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def requested_range(request, size, last_modified):
+    """
+    Диапазон (start, end) из заголовка Range или None для всего файла.
+
+    Если диапазон нельзя отдать, возвращается False. If-Range с
+    устаревшей датой означает весь файл.
+    """
+    match = RANGE_RE.match(request.META.get('HTTP_RANGE', '').strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range and if_range != last_modified:
+        return None
+    start, end = match.groups()
+    if start:
+        start = int(start)
+        end = min(int(end), size - 1) if end else size - 1
+    else:
+        start, end = max(size - int(end), 0), size - 1
+    if start > end or start >= size:
+        return False
+    return start, end
+
+
+def media_file(request, path):
+    """
+    Загруженные файлы из MEDIA_ROOT.
+
+    За фронтовым прокси файл отдаёт он сам по X-Accel-Redirect или
+    X-Sendfile (MEDIA_SENDFILE). Иначе файл отдаётся потоком через
+    FileResponse: сервер может передать его через sendfile, а Range и
+    If-Modified-Since обрабатываются здесь. Имена картинок и превью
+    содержат хэш содержимого, поэтому кэшируются надолго.
+    """
+    name, fullpath = resolve(settings.MEDIA_ROOT, path)
+    stat = os.stat(fullpath)
+    last_modified = http_date(stat.st_mtime)
+    content_type = (mimetypes.guess_type(fullpath)[0]
+                    or 'application/octet-stream')
+    if settings.MEDIA_SENDFILE == 'x-accel-redirect':
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = (
+            settings.MEDIA_ACCEL_PREFIX + quote(name))
+    elif settings.MEDIA_SENDFILE == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = fullpath
+    elif not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'),
+                                stat.st_mtime, stat.st_size):
+        return HttpResponseNotModified()
+    else:
+        byte_range = requested_range(request, stat.st_size, last_modified)
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+            return response
+        file = open(fullpath, 'rb')
+        if byte_range is None:
+            response = FileResponse(file, content_type=content_type)
+        else:
+            start, end = byte_range
+            response = FileResponse(
+                FileRange(file, start, end), status=206,
+                content_type=content_type)
+            response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+            response['Content-Length'] = end - start + 1
+        response['Accept-Ranges'] = 'bytes'
+    response['Last-Modified'] = last_modified
+    patch_cache_control(response, public=True, max_age=settings.MEDIA_MAX_AGE)
+    return response
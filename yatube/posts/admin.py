@@ -1,14 +1,56 @@
 from django.contrib import admin
 
+from . import search
+from .forms import PostForm
 from .models import Group, Post, Comment, Follow
+from .paginators import LimitedCountPaginator
 
 
-class PostAdmin(admin.ModelAdmin):
+class FullTextSearchMixin:
+    """Поиск по полнотекстовому индексу вместо LIKE по search_fields."""
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        return search.matches(queryset, search_term), False
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Список без точного COUNT(*) по всей таблице."""
+    paginator = LimitedCountPaginator
+    show_full_result_count = False
+
+
+class PostAdmin(FullTextSearchMixin, LargeTableAdmin):
     list_display = ('pk', 'text', 'pub_date', 'author', 'group')
+    list_select_related = ('author', 'group')
     search_fields = ('text',)
     list_editable = ('group',)
     list_filter = ('pub_date',)
+    date_hierarchy = 'pub_date'
     empty_value_display = '-пусто-'
+    # Картинка проходит ту же нормализацию, что и на сайте, и получает
+    # размеры для разметки.
+    form = PostForm
+    fields = ('text', 'author', 'group', 'image')
+
+    def get_form(self, request, obj=None, **kwargs):
+        form = super().get_form(request, obj, **kwargs)
+        # Класс формы строится заново на каждый запрос.
+        form.oversized_uploads = getattr(
+            request, 'oversized_uploads', frozenset())
+        return form
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        formfield = super().formfield_for_foreignkey(
+            db_field, request, **kwargs)
+        if db_field.name == 'group' and request is not None:
+            # Список групп читается один раз за запрос, а не в каждой
+            # строке list_editable.
+            if not hasattr(request, 'group_choices'):
+                request.group_choices = list(formfield.choices)
+            formfield.choices = request.group_choices
+        return formfield
 
 
 class GroupAdmin(admin.ModelAdmin):
@@ -16,8 +58,9 @@ class GroupAdmin(admin.ModelAdmin):
     empty_value_display = '-пусто-'
 
 
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(FullTextSearchMixin, LargeTableAdmin):
     list_display = ('post', 'author', 'text', 'created')
+    list_select_related = ('post', 'author')
     search_fields = ('text',)
     list_filter = ('created',)
     empty_value_display = '-пусто-'
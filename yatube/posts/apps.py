@@ -1,5 +1,16 @@
 from django.apps import AppConfig
+from django.db import connections
+from django.db.models.signals import post_migrate
+
+
+def repair_search(sender, using, **kwargs):
+    from . import search
+    search.repair(connections[using])
 
 
 class PostsConfig(AppConfig):
     name = 'posts'
+
+    def ready(self):
+        from . import checks, signals  # noqa: F401
+        post_migrate.connect(repair_search, sender=self)
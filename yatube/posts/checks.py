@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core import checks
+
+LOCMEM_BACKEND = 'django.core.cache.backends.locmem.LocMemCache'
+
+# Сроки кэша, которые держатся на общих для процессов счётчиках лент.
+TIMEOUT_SETTINGS = (
+    'FEED_CACHE_TIMEOUT', 'RESPONSE_CACHE_TIMEOUT', 'POST_CARD_CACHE_TIMEOUT',
+)
+
+# Дольше этого процесс с кэшем в своей памяти может показывать
+# устаревшие страницы: сдвиг счётчика в другом процессе он не увидит.
+LOCMEM_MAX_TIMEOUT = 60
+
+
+@checks.register(checks.Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """Счётчики лент и долгие сроки кэша требуют общего для процессов кэша."""
+    if settings.CACHES['default']['BACKEND'] != LOCMEM_BACKEND:
+        return []
+    return [
+        checks.Error(
+            f'{name} = {getattr(settings, name)} при кэше LocMemCache: '
+            f'процессы не видят сдвигов счётчиков лент друг друга.',
+            hint='Настройте общий кэш (memcached, redis или файловый) '
+                 f'или сократите срок до {LOCMEM_MAX_TIMEOUT} с.',
+            id='posts.E001',
+        )
+        for name in TIMEOUT_SETTINGS
+        if getattr(settings, name) > LOCMEM_MAX_TIMEOUT
+    ]
@@ -0,0 +1,73 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+GENERATION_KEY = 'feed:generation:{}:{}'
+
+# Лента, общая для всех: её счётчик входит в версию любой ленты и
+# сдвигается, когда меняется то, что видно во всех карточках сразу
+# (имя автора, адрес группы).
+ALL_FEEDS = ('all', '')
+
+
+def initial_generation():
+    # Счётчик начинается с текущего времени, а не с единицы: если его
+    # вытеснят из кэша, новые ключи не совпадут со старыми фрагментами.
+    return int(time.time() * 1000)
+
+
+def generations(*scopes):
+    """Счётчики нескольких лент одной строкой, одним запросом к кэшу."""
+    keys = [GENERATION_KEY.format(*scope) for scope in scopes]
+    values = cache.get_many(keys)
+    for key in keys:
+        if key not in values:
+            cache.add(key, initial_generation(), None)
+            values[key] = cache.get(key)
+    return '.'.join(str(values[key]) for key in keys)
+
+
+def version(feed, scope=''):
+    """Версия ленты: общий счётчик и счётчик самой ленты."""
+    return generations(ALL_FEEDS, (feed, scope))
+
+
+def etag(request, *scopes, extra=()):
+    """
+    ETag страницы по счётчикам лент, адресу и пользователю.
+
+    Для авторизованных учитывается и их собственный счётчик: он
+    сдвигается при подписках, от которых зависит кнопка «Подписаться».
+    """
+    scopes = (ALL_FEEDS, *scopes)
+    if request.user.is_authenticated:
+        scopes += (('user', request.user.pk),)
+    tag = ':'.join(map(str, (
+        generations(*scopes), request.get_full_path(), request.user.pk,
+        *extra,
+    )))
+    return hashlib.md5(tag.encode()).hexdigest()
+
+
+def bump(feed, scope=''):
+    """Делает все закэшированные страницы ленты устаревшими."""
+    key = GENERATION_KEY.format(feed, scope)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, initial_generation(), None)
+
+
+def bump_all():
+    bump(*ALL_FEEDS)
+
+
+def cache_context(request, feed, scope=''):
+    """Ключ и срок кэша фрагмента ленты для шаблона."""
+    page = request.GET.get('cursor') or request.GET.get('page') or '1'
+    return {
+        'feed_cache_key': f'{feed}:{scope}:{version(feed, scope)}:{page}',
+        'feed_cache_timeout': settings.FEED_CACHE_TIMEOUT,
+    }
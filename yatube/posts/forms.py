@@ -1,10 +1,19 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 from django.utils.translation import gettext_lazy as _
 
+from . import images
 from .models import Comment, Post
 
 
 class PostForm(forms.ModelForm):
+    # Поля, файлы которых LimitedUploadHandler отбросил при приёме.
+    oversized_uploads = frozenset()
+
+    def __init__(self, *args, oversized_uploads=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if oversized_uploads is not None:
+            self.oversized_uploads = oversized_uploads
 
     class Meta:
 
@@ -30,6 +39,19 @@ class PostForm(forms.ModelForm):
                 )
             return text
 
+    def clean_image(self):
+        if 'image' in self.oversized_uploads:
+            raise images.too_large()
+        image = self.cleaned_data.get('image')
+        if not image:
+            self.instance.image_width = self.instance.image_height = None
+            return image
+        if not isinstance(image, UploadedFile):
+            return image
+        image, size = images.normalize(image)
+        self.instance.image_width, self.instance.image_height = size
+        return image
+
 
 class CommentForm(forms.ModelForm):
 
@@ -0,0 +1,89 @@
+import io
+import os
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image, ImageOps
+
+# Форматы, в которых картинка хранится как есть; остальные — в PNG.
+STORED_FORMATS = {
+    'JPEG': 'image/jpeg',
+    'PNG': 'image/png',
+    'GIF': 'image/gif',
+    'WEBP': 'image/webp',
+}
+
+# Форматы, где несколько кадров — это анимация. В MPO второй кадр —
+# лишь стереопара или превью камеры, такой файл обрабатывается как JPEG.
+ANIMATED_FORMATS = {'GIF', 'PNG', 'WEBP'}
+
+
+def too_large():
+    """Ошибка файла больше POST_IMAGE_MAX_BYTES."""
+    return ValidationError(
+        'Файл больше %(limit)d МБ.',
+        params={'limit': settings.POST_IMAGE_MAX_BYTES // 2 ** 20},
+    )
+
+
+def check_budget(upload):
+    """Отклоняет файл больше байтового или пиксельного бюджета."""
+    # Загрузки с сайта обрезает ещё LimitedUploadHandler; здесь
+    # проверяются файлы, пришедшие в обход него.
+    if upload.size > settings.POST_IMAGE_MAX_BYTES:
+        raise too_large()
+    upload.seek(0)
+    # Заголовок читается без декодирования всей картинки.
+    with Image.open(upload) as image:
+        width, height = image.size
+    if width * height > settings.POST_IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            'Картинка больше %(limit)d мегапикселей.',
+            params={'limit': settings.POST_IMAGE_MAX_PIXELS // 10 ** 6},
+        )
+
+
+def normalize(upload):
+    """
+    Приводит загруженную картинку к виду для хранения.
+
+    Поворачивает по EXIF, удаляет EXIF и уменьшает до
+    POST_IMAGE_MAX_SIDE по большей стороне. Возвращает новый файл
+    и его размеры.
+    """
+    check_budget(upload)
+    upload.seek(0)
+    image = Image.open(upload)
+    image_format = image.format
+    if (image_format in ANIMATED_FORMATS
+            and getattr(image, 'is_animated', False)):
+        # Анимацию не пересобираем: только проверяем бюджет.
+        upload.seek(0)
+        return upload, image.size
+    if image_format == 'MPO':
+        # Сохраняется только первый, основной кадр.
+        image_format = 'JPEG'
+    max_side = settings.POST_IMAGE_MAX_SIDE
+    # Декодер JPEG сразу уменьшает картинку в 2–8 раз, если это возможно.
+    image.draft('RGB', (max_side, max_side))
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((max_side, max_side), Image.LANCZOS)
+
+    if image_format not in STORED_FORMATS:
+        image_format = 'PNG'
+    options = {}
+    if image_format == 'JPEG':
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        options = {'quality': settings.POST_IMAGE_JPEG_QUALITY,
+                   'optimize': True, 'progressive': True}
+    buffer = io.BytesIO()
+    image.save(buffer, image_format, **options)
+
+    name, extension = os.path.splitext(upload.name)
+    if Image.registered_extensions().get(extension.lower()) != image_format:
+        extension = '.' + image_format.lower()
+    normalized = SimpleUploadedFile(
+        name + extension, buffer.getvalue(), STORED_FORMATS[image_format])
+    return normalized, image.size
@@ -0,0 +1,63 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from PIL import Image
+
+from posts import feed_cache
+from posts.models import Post
+
+# Значения EXIF Orientation, при которых картинка повёрнута на 90°.
+ROTATED = {5, 6, 7, 8}
+
+
+def read_size(name):
+    """Размеры картинки по её заголовку с учётом поворота по EXIF."""
+    try:
+        with default_storage.open(name) as file, Image.open(file) as image:
+            width, height = image.size
+            if image.getexif().get(0x0112) in ROTATED:
+                width, height = height, width
+            return width, height
+    except (OSError, ValueError, SyntaxError):
+        return None
+
+
+class Command(BaseCommand):
+    help = ('Заполняет image_width и image_height у постов, картинки '
+            'которых загружены до того, как размеры стали сохраняться.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8)
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').filter(
+            image_width__isnull=True
+        ).order_by('pk').only('pk', 'image')
+        updated = failed = 0
+        last_pk = 0
+        with ThreadPoolExecutor(options['workers']) as pool:
+            while True:
+                batch = list(
+                    posts.filter(pk__gt=last_pk)[:options['batch_size']])
+                if not batch:
+                    break
+                last_pk = batch[-1].pk
+                sizes = pool.map(
+                    read_size, [post.image.name for post in batch])
+                changed = []
+                for post, size in zip(batch, sizes):
+                    if size is None:
+                        failed += 1
+                        continue
+                    post.image_width, post.image_height = size
+                    changed.append(post)
+                Post.objects.bulk_update(
+                    changed, ['image_width', 'image_height'])
+                updated += len(changed)
+                self.stdout.write(f'Обработано постов до id={last_pk}')
+        if updated:
+            feed_cache.bump_all()
+        self.stdout.write(self.style.SUCCESS(
+            f'Обновлено: {updated}, не удалось прочитать: {failed}'))
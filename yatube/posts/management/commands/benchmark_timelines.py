@@ -0,0 +1,118 @@
+import random
+import time
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+
+from posts import timeline
+from posts.models import TIMELINE_KEYS, Follow, Post, TimelineEntry, User
+from posts.paginators import KeysetPaginator
+from yatube.settings import POSTS_PER_PAGE
+
+PREFIX = 'timeline_bench_'
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает ленты подписок push, pull и hybrid на '
+            'синтетическом графе подписок. Все данные откатываются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=500)
+        parser.add_argument('--authors', type=int, default=50)
+        parser.add_argument(
+            '--follows', type=int, default=20,
+            help='Подписок у каждого читателя.')
+        parser.add_argument(
+            '--celebrities', type=int, default=2,
+            help='Авторов, на которых подписаны все читатели.')
+        parser.add_argument(
+            '--posts', type=int, default=5,
+            help='Постов, которые публикует каждый автор.')
+        parser.add_argument(
+            '--threshold', type=int, default=None,
+            help='Порог подписчиков для hybrid; по умолчанию раскладываются '
+                 'все, кроме «звёзд».')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        threshold = options['threshold']
+        if threshold is None:
+            threshold = options['readers'] - 1
+        strategies = (
+            ('push', options['readers'] + 1, self.read_timeline),
+            ('pull', -1, self.read_pull),
+            ('hybrid', threshold, self.read_timeline),
+        )
+        with transaction.atomic():
+            readers, authors = self.build_graph(options)
+            sample = random.sample(readers, min(len(readers), 100))
+            for name, limit, read in strategies:
+                with override_settings(TIMELINE_FANOUT_MAX_FOLLOWERS=limit):
+                    self.run(name, authors, sample, options['posts'], read)
+            transaction.set_rollback(True)
+
+    def build_graph(self, options):
+        User.objects.bulk_create(
+            User(username=f'{PREFIX}{kind}{i}')
+            for kind, count in (('reader', options['readers']),
+                                ('author', options['authors']))
+            for i in range(count)
+        )
+        users = User.objects.filter(username__startswith=PREFIX)
+        readers = list(users.filter(
+            username__contains='reader').values_list('pk', flat=True))
+        authors = list(users.filter(
+            username__contains='author').values_list('pk', flat=True))
+        celebrities = authors[:options['celebrities']]
+        regular = authors[options['celebrities']:]
+        follows = []
+        for reader in readers:
+            chosen = set(celebrities) | set(random.sample(
+                regular, min(len(regular), options['follows'])))
+            follows.extend(
+                Follow(user_id=reader, author_id=author) for author in chosen)
+        Follow.objects.bulk_create(follows)
+        call_command('recount_user_stats', stdout=StringIO())
+        return readers, authors
+
+    def run(self, name, authors, readers, posts_per_author, read):
+        Post.objects.filter(author_id__in=authors).delete()
+        cache.delete_many(
+            [timeline.RECENT_POSTS_KEY.format(pk) for pk in authors])
+        started = time.perf_counter()
+        for _ in range(posts_per_author):
+            for author in authors:
+                post = Post(author_id=author, text='Пост')
+                if name == 'pull':
+                    Post.objects.bulk_create([post])
+                else:
+                    post.save()
+        write_time = time.perf_counter() - started
+        entries = TimelineEntry.objects.filter(author_id__in=authors).count()
+        started = time.perf_counter()
+        for reader in readers:
+            read(User(pk=reader))
+        read_time = (time.perf_counter() - started) / len(readers)
+        self.stdout.write(
+            f'{name:>6}: запись {write_time:.3f} с, '
+            f'записей в лентах {entries}, '
+            f'чтение {read_time * 1000:.2f} мс на ленту'
+        )
+
+    def read_timeline(self, user):
+        paginator = KeysetPaginator(
+            timeline.feed(user), POSTS_PER_PAGE, keys=TIMELINE_KEYS)
+        return list(paginator.cursor_page())
+
+    def read_pull(self, user):
+        authors = Follow.objects.filter(user=user).values('author')
+        paginator = KeysetPaginator(
+            Post.objects.for_feed().filter(author_id__in=authors),
+            POSTS_PER_PAGE,
+        )
+        return list(paginator.cursor_page())
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from posts import middleware
+
+
+class Command(BaseCommand):
+    help = 'Показывает попадания и промахи кэша ответов для анонимов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset', action='store_true',
+            help='Обнулить счётчики после вывода.')
+
+    def handle(self, *args, **options):
+        stats = middleware.stats()
+        total = stats['hits'] + stats['misses']
+        ratio = stats['hits'] / total if total else 0
+        self.stdout.write(
+            f'Попаданий: {stats["hits"]}, промахов: {stats["misses"]}, '
+            f'доля попаданий: {ratio:.1%}'
+        )
+        if options['reset']:
+            middleware.reset_stats()
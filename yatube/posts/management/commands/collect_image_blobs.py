@@ -0,0 +1,58 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from sorl import thumbnail
+
+from posts.models import ImageBlob, Post
+
+
+class Command(BaseCommand):
+    help = ('Удаляет файлы картинок, на которые больше не ссылается ни '
+            'один пост, вместе с их превью.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--grace', type=int, default=60,
+            help='Сколько минут файл без ссылок ещё хранится: загрузка '
+                 'того же файла может быть в процессе.')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(minutes=options['grace'])
+        orphans = ImageBlob.objects.orphans(cutoff).order_by('name')
+        storage = Post._meta.get_field('image').storage
+        removed = 0
+        last_name = ''
+        while True:
+            names = list(orphans.filter(name__gt=last_name).values_list(
+                'name', flat=True)[:options['batch_size']])
+            if not names:
+                break
+            last_name = names[-1]
+            if options['dry_run']:
+                removed += len(names)
+                continue
+            for name in names:
+                removed += self.collect(orphans, storage, name)
+        verb = 'Будет удалено' if options['dry_run'] else 'Удалено'
+        self.stdout.write(self.style.SUCCESS(f'{verb} файлов: {removed}'))
+
+    def collect(self, orphans, storage, name):
+        """
+        Удаляет строку и файл в одной транзакции; 1, если файл удалён.
+
+        Строка удаляется, только если она всё ещё без ссылок и давно не
+        менялась. Пока транзакция открыта, bump() и touch() того же
+        файла ждут её конца, поэтому новая загрузка не сошлётся на
+        удаляемый файл.
+        """
+        with transaction.atomic():
+            deleted, _ = orphans.filter(name=name).delete()
+            if deleted != 1:
+                return 0
+            thumbnail.delete(name, delete_file=False)
+            storage.delete(name)
+        return 1
@@ -0,0 +1,81 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from posts.models import TIMELINE_KEYS, Comment, Group, Post, User
+from posts.paginators import KeysetPaginator
+from yatube.settings import POSTS_PER_PAGE
+
+# Признаки плана, читающего таблицу целиком, для разных СУБД.
+FULL_SCAN_MARKERS = {
+    'sqlite': ('SCAN',),
+    'postgresql': ('Seq Scan',),
+    'mysql': ('ALL',),
+}
+INDEX_MARKERS = {
+    'sqlite': ('USING INDEX', 'USING COVERING INDEX',
+               'USING INTEGER PRIMARY KEY'),
+    'postgresql': ('Index Scan', 'Index Only Scan', 'Bitmap Index Scan'),
+    'mysql': ('Using index',),
+}
+# Признаки сортировки, которую не удалось взять из индекса.
+SORT_MARKERS = ('USE TEMP B-TREE FOR ORDER BY', 'Sort Key', 'Using filesort')
+
+
+class Command(BaseCommand):
+    help = ('Выполняет EXPLAIN для запросов лент и сообщает, '
+            'какие из них читают таблицу без индекса.')
+
+    def handle(self, *args, **options):
+        failed = []
+        for name, queryset in self.feed_queries():
+            plan = queryset.explain()
+            if self.full_scan(plan):
+                failed.append(name)
+                self.stdout.write(self.style.ERROR(f'{name}: полный скан'))
+            elif any(marker in plan for marker in SORT_MARKERS):
+                self.stdout.write(self.style.WARNING(
+                    f'{name}: индекс, но сортировка во временной таблице'))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'{name}: индекс'))
+            if options['verbosity'] > 1:
+                self.stdout.write(plan)
+        if failed:
+            raise CommandError(
+                'Запросы без индекса: ' + ', '.join(failed)
+            )
+
+    def feed_queries(self):
+        """Запросы первых страниц лент на реальных данных."""
+        user = User.objects.order_by('pk').first()
+        group = Group.objects.order_by('pk').first()
+        post = Post.objects.order_by('pk').first()
+        feeds = [('index', Post.objects.for_feed(), {})]
+        if group is not None:
+            feeds.append(('group_posts', group.posts.for_feed(), {}))
+        if user is not None:
+            feeds.append(('profile', user.posts.for_feed(), {}))
+            feeds.append((
+                'follow_index',
+                Post.objects.for_feed().timeline(user),
+                {'keys': TIMELINE_KEYS},
+            ))
+        for name, queryset, options in feeds:
+            paginator = KeysetPaginator(queryset, POSTS_PER_PAGE, **options)
+            yield name, paginator.object_list[:POSTS_PER_PAGE]
+        if post is not None:
+            paginator = KeysetPaginator(
+                Comment.objects.filter(post=post), POSTS_PER_PAGE,
+                keys=('created', 'id'))
+            yield 'comments', paginator.object_list[:POSTS_PER_PAGE]
+
+    def full_scan(self, plan):
+        vendor = connection.vendor
+        for line in plan.splitlines():
+            scans = any(
+                marker in line
+                for marker in FULL_SCAN_MARKERS.get(vendor, ()))
+            indexed = any(
+                marker in line for marker in INDEX_MARKERS.get(vendor, ()))
+            if scans and not indexed:
+                return True
+        return False
@@ -0,0 +1,266 @@
+import csv
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from io import StringIO
+
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from posts import feed_cache, paginators, timeline
+from posts.models import Comment, Follow, Group, Post, User
+
+# Порядок записи пачек: комментарии ссылаются на посты из того же файла.
+KINDS = ('post', 'comment', 'follow')
+
+
+@contextmanager
+def preserved_dates(*models):
+    """Отключает auto_now и auto_now_add, чтобы даты брались из файла."""
+    fields = [
+        (field, field.auto_now, field.auto_now_add)
+        for model in models
+        for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False)
+        or getattr(field, 'auto_now_add', False)
+    ]
+    for field, _, _ in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in fields:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def parse_date(value):
+    if not value:
+        return timezone.now()
+    date = parse_datetime(value)
+    if date is None:
+        raise ValueError(f'неверная дата {value!r}')
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date)
+    return date
+
+
+class Command(BaseCommand):
+    help = ('Загружает посты, комментарии и подписки из JSONL или CSV '
+            'пачками bulk_create, а затем пересчитывает счётчики, ленты '
+            'подписок и кэши. Записи: {"type": "post", "ref", "author", '
+            '"text", "pub_date", "group"}, {"type": "comment", "post" '
+            '(ref поста), "author", "text", "created"}, {"type": "follow", '
+            '"user", "author"}. Импорт не стоит запускать параллельно с '
+            'публикацией постов: их id назначаются заранее.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл .jsonl или .csv; - для stdin.')
+        parser.add_argument('--format', choices=('jsonl', 'csv'))
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--create-users', action='store_true',
+            help='Создавать неизвестных авторов без пароля вместо пропуска '
+                 'их записей.')
+
+    def handle(self, *args, **options):
+        file_format = options['format'] or self.guess_format(options['path'])
+        self.batch_size = options['batch_size']
+        self.create_users = options['create_users']
+        self.users = {}
+        self.groups = dict(Group.objects.values_list('slug', 'pk'))
+        self.refs = {}
+        self.next_post_id = (
+            Post.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+        self.buffers = {kind: [] for kind in KINDS}
+        self.imported = dict.fromkeys(KINDS, 0)
+        self.skipped = 0
+        self.authors = set()
+        self.count_keys = {'index'}
+        started = time.monotonic()
+        with self.open_input(options['path']) as file, \
+                preserved_dates(Post, Comment):
+            for number, record in enumerate(
+                    self.records(file, file_format), 1):
+                self.add(number, record)
+            self.flush()
+        self.reset_sequences()
+        self.rebuild()
+        elapsed = time.monotonic() - started
+        imported = ', '.join(
+            f'{kind}: {count}' for kind, count in self.imported.items())
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено {imported}; пропущено: {self.skipped}; '
+            f'{elapsed:.1f} с'))
+
+    def guess_format(self, path):
+        extension = os.path.splitext(path)[1].lower()
+        if extension in ('.jsonl', '.ndjson'):
+            return 'jsonl'
+        if extension == '.csv':
+            return 'csv'
+        raise CommandError('Не удалось понять формат файла, укажите --format.')
+
+    @contextmanager
+    def open_input(self, path):
+        if path == '-':
+            yield sys.stdin
+            return
+        try:
+            file = open(path, encoding='utf-8', newline='')
+        except OSError as error:
+            raise CommandError(error)
+        with file:
+            yield file
+
+    def records(self, file, file_format):
+        if file_format == 'csv':
+            yield from csv.DictReader(file)
+            return
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield None
+
+    def add(self, number, record):
+        kind = record.get('type') if isinstance(record, dict) else None
+        if kind not in self.buffers:
+            self.skip(number, 'неизвестный тип записи')
+            return
+        self.buffers[kind].append((number, record))
+        if len(self.buffers[kind]) >= self.batch_size:
+            self.flush()
+
+    def skip(self, number, reason):
+        self.skipped += 1
+        self.stderr.write(f'Запись {number} пропущена: {reason}')
+
+    def flush(self):
+        """Пишет накопленные записи всех типов одной транзакцией."""
+        self.resolve_users(
+            record.get(field)
+            for kind, buffer in self.buffers.items()
+            for _, record in buffer
+            for field in (('user', 'author') if kind == 'follow'
+                          else ('author',))
+        )
+        with transaction.atomic():
+            for kind in KINDS:
+                getattr(self, f'write_{kind}s')(self.buffers[kind])
+                self.buffers[kind] = []
+
+    def resolve_users(self, usernames):
+        """Добавляет в карту имён id пользователей пачки одним запросом."""
+        missing = {name for name in usernames if name} - set(self.users)
+        if not missing:
+            return
+        self.users.update(User.objects.filter(
+            username__in=missing).values_list('username', 'pk'))
+        missing -= set(self.users)
+        if missing and self.create_users:
+            User.objects.bulk_create(
+                User(username=name, password=make_password(None))
+                for name in missing)
+            self.users.update(User.objects.filter(
+                username__in=missing).values_list('username', 'pk'))
+
+    def write_posts(self, buffer):
+        posts = []
+        for number, record in buffer:
+            author_id = self.users.get(record.get('author'))
+            group_slug = record.get('group') or None
+            if author_id is None:
+                self.skip(number, 'неизвестный автор')
+                continue
+            if group_slug and group_slug not in self.groups:
+                self.skip(number, 'неизвестная группа')
+                continue
+            try:
+                pub_date = parse_date(record.get('pub_date'))
+            except ValueError as error:
+                self.skip(number, error)
+                continue
+            post = Post(
+                id=self.next_post_id,
+                author_id=author_id,
+                group_id=self.groups.get(group_slug),
+                text=record.get('text') or '',
+                pub_date=pub_date,
+                updated_at=pub_date,
+            )
+            self.next_post_id += 1
+            if record.get('ref'):
+                self.refs[str(record['ref'])] = post.id
+            self.authors.add(author_id)
+            self.count_keys.add(f'profile:{record["author"]}')
+            if group_slug:
+                self.count_keys.add(f'group:{group_slug}')
+            posts.append(post)
+        Post.objects.bulk_create(posts, batch_size=self.batch_size)
+        self.imported['post'] += len(posts)
+
+    def write_comments(self, buffer):
+        comments = []
+        for number, record in buffer:
+            author_id = self.users.get(record.get('author'))
+            post_id = self.refs.get(str(record.get('post')))
+            if author_id is None or post_id is None:
+                self.skip(number, 'неизвестный автор или пост')
+                continue
+            try:
+                created = parse_date(record.get('created'))
+            except ValueError as error:
+                self.skip(number, error)
+                continue
+            comments.append(Comment(
+                post_id=post_id,
+                author_id=author_id,
+                text=record.get('text') or '',
+                created=created,
+                updated_at=created,
+            ))
+        Comment.objects.bulk_create(comments, batch_size=self.batch_size)
+        self.imported['comment'] += len(comments)
+
+    def write_follows(self, buffer):
+        follows = []
+        for number, record in buffer:
+            user_id = self.users.get(record.get('user'))
+            author_id = self.users.get(record.get('author'))
+            if user_id is None or author_id is None or user_id == author_id:
+                self.skip(number, 'неизвестный или тот же пользователь')
+                continue
+            self.authors.add(author_id)
+            follows.append(Follow(user_id=user_id, author_id=author_id))
+        # Уже существующие подписки пропускаются базой.
+        Follow.objects.bulk_create(
+            follows, batch_size=self.batch_size, ignore_conflicts=True)
+        self.imported['follow'] += len(follows)
+
+    def reset_sequences(self):
+        # id постов назначены явно: счётчик PostgreSQL нужно догнать.
+        statements = connection.ops.sequence_reset_sql(no_style(), [Post])
+        if statements:
+            with connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
+
+    def rebuild(self):
+        """Один проход по всему, что сигналы обновляют при обычной записи."""
+        call_command('recount_user_stats', stdout=StringIO())
+        timeline.rebuild(sorted(self.authors))
+        cache.delete_many(
+            [paginators.COUNT_KEY.format(name) for name in self.count_keys])
+        feed_cache.bump_all()
@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from posts.models import Comment, Follow, Post, User, UserStats
+
+# Счётчик UserStats -> (модель, поле с владельцем записи).
+COUNTERS = {
+    'posts_count': (Post, 'author'),
+    'comments_count': (Comment, 'author'),
+    'followers_count': (Follow, 'author'),
+    'following_count': (Follow, 'user'),
+}
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики UserStats по фактическим данным.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько пользователей пересчитывать за один проход.')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать число расхождений, ничего не менять.')
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by('pk').values_list('pk', flat=True)
+        batch_size = options['batch_size']
+        fixed = 0
+        user_ids = list(users[:batch_size])
+        while user_ids:
+            fixed += self.recount(user_ids, options['dry_run'])
+            user_ids = list(
+                users.filter(pk__gt=user_ids[-1])[:batch_size])
+        self.stdout.write(self.style.SUCCESS(
+            f'Расхождений в счётчиках: {fixed}'))
+
+    def recount(self, user_ids, dry_run):
+        actual = {pk: dict.fromkeys(COUNTERS, 0) for pk in user_ids}
+        for field, (model, owner) in COUNTERS.items():
+            rows = model.objects.filter(
+                **{f'{owner}__in': user_ids}
+            ).order_by().values_list(owner).annotate(Count('pk'))
+            for user_id, count in rows:
+                actual[user_id][field] = count
+        stored = UserStats.objects.in_bulk(user_ids)
+        created, changed = [], []
+        for user_id, counts in actual.items():
+            stats = stored.get(user_id)
+            if stats is None:
+                if any(counts.values()):
+                    created.append(UserStats(user_id=user_id, **counts))
+                continue
+            if any(getattr(stats, field) != count
+                   for field, count in counts.items()):
+                for field, count in counts.items():
+                    setattr(stats, field, count)
+                changed.append(stats)
+        if not dry_run:
+            with transaction.atomic():
+                UserStats.objects.bulk_create(created)
+                UserStats.objects.bulk_update(changed, list(COUNTERS))
+        return len(created) + len(changed)
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from posts import timeline
+
+
+class Command(BaseCommand):
+    help = ('Обрезает ленты подписок до TIMELINE_MAX_ENTRIES записей. '
+            'Публикация постов ленты не обрезает, поэтому команду нужно '
+            'запускать периодически, например раз в час из cron.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Сколько лент обрезать одним запросом.')
+
+    def handle(self, *args, **options):
+        user_ids = list(timeline.overflowing())
+        batch_size = options['batch_size']
+        deleted = 0
+        for start in range(0, len(user_ids), batch_size):
+            deleted += timeline.trim(user_ids[start:start + batch_size])
+        self.stdout.write(self.style.SUCCESS(
+            f'Обрезано лент: {len(user_ids)}, удалено записей: {deleted}'))
@@ -0,0 +1,144 @@
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from posts import feed_cache, thumbnails
+from posts.models import Post
+
+
+def warm(name, force=False):
+    """
+    Готовит превью одной картинки; при force сначала удаляет старые.
+
+    None — превью уже были, иначе — удалось ли их подготовить.
+    """
+    if force:
+        default.kvstore.delete_thumbnails(ImageFile(name))
+    elif thumbnails.ready(name):
+        return None
+    return thumbnails.render(name)
+
+
+class Command(BaseCommand):
+    help = ('Готовит все превью POST_THUMBNAILS для постов с картинками: '
+            'после смены размеров превью или восстановления media.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Процессов генерации; при 0 превью готовятся в этом '
+                 'процессе.')
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument(
+            '--rate', type=float, default=0,
+            help='Не больше стольких картинок в секунду; 0 — без предела.')
+        parser.add_argument(
+            '--checkpoint',
+            help='Файл, куда после каждой пачки пишется последний '
+                 'обработанный id; при повторном запуске работа '
+                 'продолжается с него.')
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Начать с начала, не читая контрольную точку.')
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Удалить существующие превью и сгенерировать заново.')
+
+    def handle(self, *args, **options):
+        checkpoint = options['checkpoint']
+        last_pk = 0
+        if checkpoint and not options['restart']:
+            last_pk = self.read_checkpoint(checkpoint)
+            if last_pk:
+                self.stdout.write(f'Продолжение после id={last_pk}')
+        posts = Post.objects.exclude(image='').order_by('pk').values_list(
+            'pk', 'image')
+        total = posts.filter(pk__gt=last_pk).count()
+        pool = None
+        if options['workers']:
+            # Процессы запускаются заново, а не через fork: так они не
+            # наследуют соединения с базой и потоки пула превью.
+            pool = ProcessPoolExecutor(
+                options['workers'],
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=django.setup,
+            )
+        self.done = self.failed = self.created = 0
+        self.started = time.monotonic()
+        seen = set()
+        try:
+            while True:
+                batch = list(
+                    posts.filter(pk__gt=last_pk)[:options['batch_size']])
+                if not batch:
+                    break
+                # Одинаковые картинки хранятся одним файлом.
+                names = [name for _, name in batch if name not in seen]
+                names = list(dict.fromkeys(names))
+                seen.update(names)
+                self.warm_batch(pool, names, options)
+                self.done += len(batch) - len(names)
+                last_pk = batch[-1][0]
+                if checkpoint:
+                    self.write_checkpoint(checkpoint, last_pk)
+                self.report(total, last_pk)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        if self.created:
+            feed_cache.bump_all()
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: {self.done}, новых: {self.created}, '
+            f'с ошибками: {self.failed}'))
+
+    def warm_batch(self, pool, names, options):
+        # Картинки отдаются пулу порциями по числу процессов, чтобы
+        # ограничение скорости действовало внутри пачки.
+        step = max(options['workers'], 1)
+        force = [options['force']] * step
+        for start in range(0, len(names), step):
+            chunk = names[start:start + step]
+            if pool is None:
+                results = [warm(name, options['force']) for name in chunk]
+            else:
+                results = list(pool.map(warm, chunk, force))
+            self.done += len(chunk)
+            self.failed += results.count(False)
+            self.created += results.count(True)
+            self.throttle(options['rate'])
+
+    def throttle(self, rate):
+        if not rate:
+            return
+        delay = self.done / rate - (time.monotonic() - self.started)
+        if delay > 0:
+            time.sleep(delay)
+
+    def report(self, total, last_pk):
+        elapsed = time.monotonic() - self.started
+        speed = self.done / elapsed if elapsed else 0
+        self.stdout.write(
+            f'{self.done}/{total} до id={last_pk}, '
+            f'{speed:.1f} картинок/с, ошибок: {self.failed}')
+
+    def read_checkpoint(self, path):
+        try:
+            with open(path) as file:
+                return json.load(file)['last_pk']
+        except (OSError, ValueError, KeyError):
+            return 0
+
+    def write_checkpoint(self, path, last_pk):
+        # Запись через временный файл: прерванный запуск не оставит
+        # контрольную точку наполовину записанной.
+        temporary = f'{path}.tmp'
+        with open(temporary, 'w') as file:
+            json.dump({'last_pk': last_pk}, file)
+        os.replace(temporary, path)
@@ -0,0 +1,81 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.urls import Resolver404, resolve
+
+from . import feed_cache
+
+RESPONSE_KEY = 'response:{}:{}'
+STATS_KEY = 'response:stats:{}'
+
+
+class AnonymousCacheMiddleware:
+    """
+    Отдаёт анонимным пользователям готовые ответы лент и страницы поста.
+
+    Ключ строится по пути, строке запроса и версии ответов, которую
+    сдвигают сигналы моделей. Запросы с сессией и ответы, которые
+    ставят куки или содержат CSRF-токен, не кэшируются.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        key = self.cache_key(request)
+        if key is None:
+            return self.get_response(request)
+        response = cache.get(key)
+        if response is not None:
+            count('hits')
+            response['X-Cache'] = 'HIT'
+            return response
+        count('misses')
+        response = self.get_response(request)
+        if request.method == 'GET' and self.is_cacheable(request, response):
+            cache.set(key, response, settings.RESPONSE_CACHE_TIMEOUT)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    def cache_key(self, request):
+        if request.method not in ('GET', 'HEAD'):
+            return None
+        if settings.SESSION_COOKIE_NAME in request.COOKIES:
+            return None
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return None
+        if match.view_name not in settings.RESPONSE_CACHE_VIEWS:
+            return None
+        path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+        return RESPONSE_KEY.format(feed_cache.version('responses'), path)
+
+    def is_cacheable(self, request, response):
+        return (
+            response.status_code == 200
+            and not response.streaming
+            and not response.cookies
+            and not request.META.get('CSRF_COOKIE_USED')
+        )
+
+
+def count(name):
+    key = STATS_KEY.format(name)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, None)
+        cache.incr(key)
+
+
+def stats():
+    """Счётчики попаданий и промахов кэша ответов."""
+    names = ('hits', 'misses')
+    values = cache.get_many([STATS_KEY.format(name) for name in names])
+    return {name: values.get(STATS_KEY.format(name), 0) for name in names}
+
+
+def reset_stats():
+    cache.delete_many([STATS_KEY.format(name) for name in ('hits', 'misses')])
@@ -0,0 +1,56 @@
+# Generated by Django 2.2.16 on 2026-10-18 16:45
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.deletion
+
+
+def fill_user_stats(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    Follow = apps.get_model('posts', 'Follow')
+    UserStats = apps.get_model('posts', 'UserStats')
+    counters = {
+        'posts_count': (Post, 'author'),
+        'comments_count': (Comment, 'author'),
+        'followers_count': (Follow, 'author'),
+        'following_count': (Follow, 'user'),
+    }
+    stats = {}
+    for field, (model, owner) in counters.items():
+        rows = model.objects.order_by().values_list(owner).annotate(
+            Count('pk'))
+        for user_id, count in rows:
+            stats.setdefault(user_id, {})[field] = count
+    UserStats.objects.bulk_create(
+        [UserStats(user_id=user_id, **counts)
+         for user_id, counts in stats.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0011_auto_20261018_1644'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                ('posts_count', models.PositiveIntegerField(default=0, verbose_name='Постов')),
+                ('followers_count', models.PositiveIntegerField(default=0, verbose_name='Подписчиков')),
+                ('following_count', models.PositiveIntegerField(default=0, verbose_name='Подписок')),
+                ('comments_count', models.PositiveIntegerField(default=0, verbose_name='Комментариев')),
+            ],
+            options={
+                'verbose_name': 'Статистика пользователя',
+                'verbose_name_plural': 'Статистика пользователей',
+            },
+        ),
+        migrations.RunPython(fill_user_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 2.2.16 on 2026-10-18 16:54
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def fill_updated_at(apps, schema_editor):
+    Comment = apps.get_model('posts', 'Comment')
+    Comment.objects.update(updated_at=F('created'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_post_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Дата изменения комментария'),
+        ),
+        migrations.RunPython(fill_updated_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', '-updated_at'], name='comment_post_updated_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-updated_at'], name='post_updated_at_idx'),
+        ),
+    ]
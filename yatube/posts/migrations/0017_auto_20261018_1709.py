@@ -0,0 +1,46 @@
+# Generated by Django 2.2.16 on 2026-10-18 17:09
+
+from django.db import migrations, models
+from django.db.models import Count
+import posts.storage
+
+
+def fill_image_blobs(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    ImageBlob = apps.get_model('posts', 'ImageBlob')
+    rows = Post.objects.exclude(image='').order_by().values_list(
+        'image').annotate(Count('pk'))
+    ImageBlob.objects.bulk_create(
+        ImageBlob(name=name, references=count) for name, count in rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_auto_20261018_1706'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageBlob',
+            fields=[
+                ('name', models.CharField(max_length=255, primary_key=True, serialize=False, verbose_name='Файл')),
+                ('references', models.PositiveIntegerField(default=0, verbose_name='Ссылок')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Изменён')),
+            ],
+            options={
+                'verbose_name': 'Файл картинки',
+                'verbose_name_plural': 'Файлы картинок',
+            },
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, storage=posts.storage.ContentHashStorage(), upload_to='posts/', verbose_name='Картинка'),
+        ),
+        migrations.AddIndex(
+            model_name='imageblob',
+            index=models.Index(fields=['references', 'updated_at'], name='image_blob_orphans_idx'),
+        ),
+        migrations.RunPython(fill_image_blobs, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,45 @@
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .storage import ContentHashStorage
 
 User = get_user_model()
 
+# Поля, которые нужны карточке поста в лентах.
+FEED_FIELDS = (
+    'id', 'text', 'pub_date', 'updated_at',
+    'image', 'image_width', 'image_height',
+    'author__id', 'author__username',
+    'author__first_name', 'author__last_name',
+    'group__id', 'group__slug', 'group__title',
+)
+
+
+# Ключи пагинации для PostQuerySet.timeline().
+TIMELINE_KEYS = ('timeline_date', 'timeline_post')
+
+
+class PostQuerySet(models.QuerySet):
+
+    def for_feed(self):
+        """Посты ленты вместе с автором и группой одним запросом."""
+        return self.select_related('author', 'group').only(*FEED_FIELDS)
+
+    def timeline(self, user):
+        """
+        Лента подписок пользователя из материализованного таймлайна.
+
+        Ключи пагинации берутся из самого таймлайна (TIMELINE_KEYS),
+        поэтому страница читается по индексу ленты без сортировки.
+        """
+        return self.filter(timeline_entries__user=user).annotate(
+            timeline_date=F('timeline_entries__pub_date'),
+            timeline_post=F('timeline_entries__post_id'),
+        )
+
 
 class Group(models.Model):
     title = models.CharField(max_length=200)
@@ -23,6 +60,10 @@ class Post(models.Model):
         auto_now_add=True,
         verbose_name='Дата публикации'
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения'
+    )
     group = models.ForeignKey(
         Group,
         on_delete=models.SET_NULL,
@@ -42,13 +83,30 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=ContentHashStorage(),
         blank=True,
     )
+    image_width = models.PositiveIntegerField(
+        'Ширина картинки', null=True, blank=True, editable=False)
+    image_height = models.PositiveIntegerField(
+        'Высота картинки', null=True, blank=True, editable=False)
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ['-pub_date']
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='post_pub_date_idx'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='post_author_pub_date_idx'),
+            models.Index(fields=['group', '-pub_date', '-id'],
+                         name='post_group_pub_date_idx'),
+            models.Index(fields=['-updated_at'],
+                         name='post_updated_at_idx'),
+        ]
 
     def __str__(self):
         return self.text[:15]
@@ -74,9 +132,19 @@ class Comment(models.Model):
         auto_now_add=True,
         verbose_name='Дата публикации комментария'
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения комментария'
+    )
 
     class Meta:
         ordering = ['-created']
+        indexes = [
+            models.Index(fields=['post', '-created', '-id'],
+                         name='comment_post_created_idx'),
+            models.Index(fields=['post', '-updated_at'],
+                         name='comment_post_updated_at_idx'),
+        ]
 
 
 class Follow(models.Model):
@@ -97,3 +165,147 @@ class Follow(models.Model):
             models.UniqueConstraint(fields=['author', 'user'],
                                     name='unique_following')
         ]
+        indexes = [
+            models.Index(fields=['user', 'author'],
+                         name='follow_user_author_idx'),
+        ]
+
+
+class UserStatsQuerySet(models.QuerySet):
+
+    def for_user(self, user):
+        """Счётчики пользователя; для новичка — несохранённые нули."""
+        try:
+            return user.stats
+        except UserStats.DoesNotExist:
+            return self.model(user=user)
+
+    def bump(self, user_id, **deltas):
+        """Атомарно сдвигает счётчики пользователя на заданные величины."""
+        changes = {
+            field: Greatest(F(field) + delta, 0)
+            for field, delta in deltas.items()
+        }
+        if self.filter(user_id=user_id).update(**changes):
+            return
+        if any(delta < 0 for delta in deltas.values()):
+            return
+        with transaction.atomic():
+            stats, created = self.get_or_create(
+                user_id=user_id, defaults=deltas)
+        if not created:
+            self.filter(user_id=user_id).update(**changes)
+
+
+class UserStats(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь'
+    )
+    posts_count = models.PositiveIntegerField('Постов', default=0)
+    followers_count = models.PositiveIntegerField('Подписчиков', default=0)
+    following_count = models.PositiveIntegerField('Подписок', default=0)
+    comments_count = models.PositiveIntegerField('Комментариев', default=0)
+
+    objects = UserStatsQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Статистика пользователя'
+        verbose_name_plural = 'Статистика пользователей'
+
+    def __str__(self):
+        return str(self.user_id)
+
+
+class TimelineEntry(models.Model):
+    """Пост в ленте подписок пользователя, разложенный при публикации."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Читатель'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи лент'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'],
+                                    name='unique_timeline_post')
+        ]
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-post'],
+                         name='timeline_user_pub_date_idx'),
+            models.Index(fields=['user', 'author'],
+                         name='timeline_user_author_idx'),
+        ]
+
+
+class ImageBlobQuerySet(models.QuerySet):
+
+    def bump(self, name, delta):
+        """Атомарно сдвигает число постов, ссылающихся на файл."""
+        changes = {
+            'references': Greatest(F('references') + delta, 0),
+            'updated_at': timezone.now(),
+        }
+        if self.filter(name=name).update(**changes) or delta < 0:
+            return
+        with transaction.atomic():
+            blob, created = self.get_or_create(
+                name=name, defaults={'references': delta})
+        if not created:
+            self.filter(name=name).update(**changes)
+
+    def touch(self, name):
+        """
+        Отмечает, что файл только что понадобился снова.
+
+        Сборщик удаляет только строки, не менявшиеся дольше срока
+        ожидания, поэтому после touch() файл не будет удалён.
+        """
+        if self.filter(name=name).update(updated_at=timezone.now()):
+            return
+        with transaction.atomic():
+            self.get_or_create(name=name)
+
+    def orphans(self, older_than):
+        """Файлы без ссылок, которые не менялись с момента `older_than`."""
+        return self.filter(references=0, updated_at__lt=older_than)
+
+
+class ImageBlob(models.Model):
+    """Файл картинки в хранилище и число постов, которые на него ссылаются."""
+
+    name = models.CharField('Файл', max_length=255, primary_key=True)
+    references = models.PositiveIntegerField('Ссылок', default=0)
+    updated_at = models.DateTimeField('Изменён', auto_now=True)
+
+    objects = ImageBlobQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Файл картинки'
+        verbose_name_plural = 'Файлы картинок'
+        indexes = [
+            models.Index(fields=['references', 'updated_at'],
+                         name='image_blob_orphans_idx'),
+        ]
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,208 @@
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+COUNT_KEY = 'paginator:count:{}'
+
+
+def adjust_count(name, delta):
+    """Поправляет закэшированное число записей ленты после записи."""
+    try:
+        cache.incr(COUNT_KEY.format(name), delta)
+    except ValueError:
+        pass
+
+
+class CursorPage(Page):
+    """Страница, полученная по курсору: без номера и без COUNT(*)."""
+
+    def __init__(self, object_list, paginator, has_previous, has_next):
+        super().__init__(object_list, None, paginator)
+        self._has_previous = has_previous
+        self._has_next = has_next
+
+    def __repr__(self):
+        return '<Cursor page>'
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+
+class KeysetPaginator(Paginator):
+    """
+    Пагинатор по ключу (по умолчанию `(pub_date, id)`, по убыванию).
+
+    Первые `max_page_number` страниц доступны по старому `?page=N`,
+    дальше лента листается непрозрачными курсорами `?cursor=`,
+    которые не требуют ни COUNT(*), ни OFFSET.
+
+    С `count_key` число записей берётся из кэша: оно пересчитывается
+    раз в PAGINATOR_COUNT_TIMEOUT, а между пересчётами поправляется
+    сигналами через adjust_count().
+    """
+
+    def __init__(self, object_list, per_page, keys=('pub_date', 'id'),
+                 max_page_number=None, count_key=None, **kwargs):
+        self.keys = keys
+        self.count_key = count_key
+        self.max_page_number = (
+            max_page_number or settings.PAGINATOR_MAX_PAGE_NUMBER
+        )
+        object_list = object_list.order_by(*(f'-{key}' for key in keys))
+        super().__init__(object_list, per_page, **kwargs)
+
+    @cached_property
+    def count(self):
+        if self.count_key is None:
+            return super().count
+        key = COUNT_KEY.format(self.count_key)
+        count = cache.get(key)
+        if count is None:
+            count = super().count
+            cache.set(key, count, settings.PAGINATOR_COUNT_TIMEOUT)
+        return max(count, 0)
+
+    @property
+    def is_approximate(self):
+        return (self.count_key is not None
+                and self.count > settings.PAGINATOR_APPROXIMATE_COUNT)
+
+    @property
+    def display_count(self):
+        """Число записей для показа: большое округляется до двух цифр."""
+        if not self.is_approximate:
+            return self.count
+        return round(self.count, 2 - len(str(self.count)))
+
+    @property
+    def page_range(self):
+        return range(1, min(self.num_pages, self.max_page_number) + 1)
+
+    def page_window(self, number, on_each_side=2, on_ends=1):
+        """Номера страниц вокруг текущей и по краям; None — пропуск."""
+        last = self.page_range[-1]
+        pages = {
+            *range(1, on_ends + 1),
+            *range(number - on_each_side, number + on_each_side + 1),
+            *range(last - on_ends + 1, last + 1),
+        }
+        window, previous = [], 0
+        for page in sorted(page for page in pages if 1 <= page <= last):
+            if page - previous > 1:
+                window.append(None)
+            window.append(page)
+            previous = page
+        return window
+
+    def get_page(self, number):
+        try:
+            number = self.validate_number(number)
+        except PageNotAnInteger:
+            number = 1
+        except EmptyPage:
+            number = self.num_pages
+        return self.page(min(number, self.max_page_number))
+
+    def cursor_page(self, token=None):
+        """Страница после курсора; без курсора — первая, без COUNT(*)."""
+        cursor = self.decode_cursor(token) if token else None
+        queryset = self.object_list
+        backwards = False
+        if cursor is not None:
+            values, backwards = cursor
+            queryset = queryset.filter(
+                self._after(values, 'gt' if backwards else 'lt')
+            )
+            if backwards:
+                queryset = queryset.reverse()
+        objects = list(queryset[:self.per_page + 1])
+        has_more = len(objects) > self.per_page
+        objects = objects[:self.per_page]
+        if backwards:
+            objects.reverse()
+            return CursorPage(objects, self, has_more, True)
+        return CursorPage(objects, self, cursor is not None, has_more)
+
+    def next_cursor(self, page):
+        objects = list(page)
+        return self.encode_cursor(objects[-1]) if objects else None
+
+    def previous_cursor(self, page):
+        objects = list(page)
+        return self.encode_cursor(objects[0], True) if objects else None
+
+    def encode_cursor(self, obj, backwards=False):
+        values = [str(getattr(obj, key)) for key in self.keys]
+        data = json.dumps([values, backwards]).encode()
+        return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+    def decode_cursor(self, token):
+        """Разбирает курсор; для испорченного курсора возвращает None."""
+        try:
+            data = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+            values, backwards = json.loads(data)
+            values = [
+                self._key_field(key).to_python(value)
+                for key, value in zip(self.keys, values)
+            ]
+        except (binascii.Error, ValueError, TypeError, ValidationError):
+            return None
+        if len(values) != len(self.keys) or None in values:
+            return None
+        return values, bool(backwards)
+
+    def _key_field(self, key):
+        annotation = self.object_list.query.annotations.get(key)
+        if annotation is not None:
+            return annotation.output_field
+        return self.object_list.model._meta.get_field(key)
+
+    def _after(self, values, lookup):
+        condition = Q()
+        for position, key in enumerate(self.keys):
+            condition |= Q(
+                **dict(zip(self.keys[:position], values[:position])),
+                **{f'{key}__{lookup}': values[position]},
+            )
+        return condition
+
+
+class LimitedCountPaginator(Paginator):
+    """
+    Пагинатор для админки, который не считает большие таблицы целиком.
+
+    Записи считаются только до ADMIN_COUNT_LIMIT. Если их больше, на
+    PostgreSQL для выборки без фильтров берётся оценка из статистики
+    планировщика, иначе число ограничивается порогом.
+    """
+
+    @cached_property
+    def count(self):
+        limit = settings.ADMIN_COUNT_LIMIT
+        count = self.object_list[:limit + 1].count()
+        if count <= limit:
+            return count
+        return max(self.estimate(), limit)
+
+    def estimate(self):
+        query = self.object_list.query
+        connection = connections[self.object_list.db]
+        if connection.vendor != 'postgresql' or query.where:
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples FROM pg_class WHERE relname = %s',
+                [query.model._meta.db_table])
+            row = cursor.fetchone()
+        return int(row[0]) if row else 0
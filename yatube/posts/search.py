@@ -0,0 +1,215 @@
+"""
+Полнотекстовый поиск по постам и комментариям.
+
+На SQLite текст индексируется в таблицах FTS5, которые триггеры держат
+в синхронизации с posts_post и posts_comment — в том числе при
+bulk_create и update(). На PostgreSQL запросы идут по GIN-индексу на
+to_tsvector. На остальных базах поиск сводится к icontains.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection, models
+from django.db.models import FloatField, Lookup, Q, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce
+
+# Таблицы с полем text, которые индексируются.
+TABLES = ('posts_post', 'posts_comment')
+
+WORD_RE = re.compile(r'\w+')
+
+# Внешнее содержимое: FTS5 хранит только индекс, текст берётся из
+# исходной таблицы по rowid.
+SQLITE_TABLE = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS {table}_fts USING fts5("
+    "text, content='{table}', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')"
+)
+SQLITE_TRIGGERS = {
+    '{table}_fts_insert': (
+        "CREATE TRIGGER IF NOT EXISTS {table}_fts_insert "
+        "AFTER INSERT ON {table} BEGIN "
+        "INSERT INTO {table}_fts(rowid, text) VALUES (new.id, new.text); "
+        "END"
+    ),
+    '{table}_fts_delete': (
+        "CREATE TRIGGER IF NOT EXISTS {table}_fts_delete "
+        "AFTER DELETE ON {table} BEGIN "
+        "INSERT INTO {table}_fts({table}_fts, rowid, text) "
+        "VALUES ('delete', old.id, old.text); "
+        "END"
+    ),
+    '{table}_fts_update': (
+        "CREATE TRIGGER IF NOT EXISTS {table}_fts_update "
+        "AFTER UPDATE OF text ON {table} BEGIN "
+        "INSERT INTO {table}_fts({table}_fts, rowid, text) "
+        "VALUES ('delete', old.id, old.text); "
+        "INSERT INTO {table}_fts(rowid, text) VALUES (new.id, new.text); "
+        "END"
+    ),
+}
+POSTGRESQL_INDEX = (
+    "CREATE INDEX IF NOT EXISTS {table}_text_search_idx ON {table} "
+    "USING GIN (to_tsvector('{config}'::regconfig, COALESCE(text, '')))"
+)
+
+
+def install(connection):
+    """Создаёт поисковые индексы и наполняет их; вызывается миграцией."""
+    with connection.cursor() as cursor:
+        for table in TABLES:
+            if connection.vendor == 'sqlite':
+                cursor.execute(SQLITE_TABLE.format(table=table))
+            elif connection.vendor == 'postgresql':
+                cursor.execute(POSTGRESQL_INDEX.format(
+                    table=table, config=settings.SEARCH_CONFIG))
+    repair(connection)
+
+
+def repair(connection):
+    """
+    Восстанавливает триггеры FTS5 после migrate.
+
+    SQLite удаляет триггеры, когда миграция пересоздаёт таблицу; тогда
+    они создаются заново, а индекс перестраивается по исходной таблице.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master "
+                       "WHERE type IN ('table', 'trigger')")
+        existing = {name for name, in cursor.fetchall()}
+        for table in TABLES:
+            names = {name.format(table=table) for name in SQLITE_TRIGGERS}
+            if f'{table}_fts' not in existing or names <= existing:
+                continue
+            for sql in SQLITE_TRIGGERS.values():
+                cursor.execute(sql.format(table=table))
+            cursor.execute(
+                f"INSERT INTO {table}_fts({table}_fts) VALUES ('rebuild')")
+
+
+def uninstall(connection):
+    with connection.cursor() as cursor:
+        for table in TABLES:
+            if connection.vendor == 'sqlite':
+                for name in SQLITE_TRIGGERS:
+                    cursor.execute(
+                        f'DROP TRIGGER IF EXISTS {name.format(table=table)}')
+                cursor.execute(f'DROP TABLE IF EXISTS {table}_fts')
+            elif connection.vendor == 'postgresql':
+                cursor.execute(
+                    f'DROP INDEX IF EXISTS {table}_text_search_idx')
+
+
+def fts_query(text):
+    """
+    Запрос FTS5 из слов пользователя: все слова, каждое как префикс.
+
+    Операторы FTS5 в тексте не работают — слова берутся в кавычки.
+    """
+    return ' '.join(f'"{word}"*' for word in WORD_RE.findall(text))
+
+
+class FullTextMatch(Lookup):
+    """
+    `pk__fts=запрос`: запись есть в выдаче FTS5 своей таблицы.
+
+    Поиск — лукап, а не extra(where=...): так Django сам подставляет
+    псевдоним таблицы, и условие работает и во вложенных запросах.
+    """
+    lookup_name = 'fts'
+    # Запрос FTS5 — строка, её не нужно приводить к типу ключа.
+    prepare_rhs = False
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        table = self.lhs.target.model._meta.db_table
+        return (
+            f'{lhs} IN (SELECT rowid FROM {table}_fts '
+            f'WHERE {table}_fts MATCH {rhs})',
+            lhs_params + rhs_params,
+        )
+
+
+models.AutoField.register_lookup(FullTextMatch)
+
+
+def matches(queryset, text):
+    """Записи выборки, текст которых подходит под запрос."""
+    return _search(queryset, text, ranked=False)
+
+
+def ranked(queryset, text, also=()):
+    """
+    Подходящие записи с релевантностью в `search_rank`.
+
+    Чем больше search_rank, тем выше запись; вместе с id он годится как
+    ключ KeysetPaginator.
+
+    `also` — пары (выборка, поле): запись подходит и тогда, когда под
+    запрос подходит ссылающаяся на неё запись выборки, например
+    ((Comment.objects.all(), 'post'),). Релевантность считается только
+    по тексту самой записи, поэтому такие записи идут после остальных.
+    """
+    return _search(queryset, text, ranked=True, also=also)
+
+
+def _search(queryset, text, ranked, also=()):
+    if not WORD_RE.search(text):
+        # Пустая выборка тоже несёт search_rank: по нему её упорядочит
+        # KeysetPaginator.
+        queryset = queryset.none()
+        if not ranked:
+            return queryset
+        return queryset.annotate(
+            search_rank=Value(0.0, output_field=FloatField()))
+    condition = _condition(queryset.model, text)
+    for related, field in also:
+        condition |= Q(pk__in=related.filter(
+            _condition(related.model, text)).values(field))
+    queryset = queryset.filter(condition)
+    if not ranked:
+        return queryset
+    return queryset.annotate(search_rank=Coalesce(
+        _rank(queryset.model, text), Value(0.0),
+        output_field=FloatField()))
+
+
+def _condition(model, text):
+    """Условие filter(), под которое подходят записи с текстом запроса."""
+    if connection.vendor == 'sqlite':
+        return Q(pk__fts=fts_query(text))
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import SearchQuery, SearchVector
+
+        # Выражение совпадает с выражением GIN-индекса из install().
+        found = model._default_manager.annotate(
+            search_vector=SearchVector('text', config=settings.SEARCH_CONFIG),
+        ).filter(
+            search_vector=SearchQuery(text, config=settings.SEARCH_CONFIG))
+        return Q(pk__in=found.values('pk'))
+    condition = Q()
+    for word in WORD_RE.findall(text):
+        condition &= Q(text__icontains=word)
+    return condition
+
+
+def _rank(model, text):
+    """Релевантность текста записи; NULL или 0, если он не подходит."""
+    table = model._meta.db_table
+    if connection.vendor == 'sqlite':
+        # bm25() тем меньше, чем запись релевантнее.
+        return RawSQL(
+            f'SELECT -bm25({table}_fts) FROM {table}_fts '
+            f'WHERE {table}_fts MATCH %s AND rowid = {table}.id',
+            [fts_query(text)], output_field=FloatField())
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                                    SearchVector)
+        return SearchRank(
+            SearchVector('text', config=settings.SEARCH_CONFIG),
+            SearchQuery(text, config=settings.SEARCH_CONFIG))
+    return Value(0.0, output_field=FloatField())
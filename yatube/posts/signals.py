@@ -0,0 +1,187 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import feed_cache, paginators, thumbnails, timeline
+from .models import Comment, Follow, Group, ImageBlob, Post, User, UserStats
+
+
+@receiver(post_save, sender=Post)
+def count_new_post(sender, instance, created, **kwargs):
+    if created:
+        UserStats.objects.bump(instance.author_id, posts_count=1)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, **kwargs):
+    if created:
+        timeline.forget_recent(instance.author_id)
+        timeline.fan_out(instance)
+
+
+@receiver(post_delete, sender=Post)
+def forget_deleted_post(sender, instance, **kwargs):
+    timeline.forget_recent(instance.author_id)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    UserStats.objects.bump(instance.author_id, posts_count=-1)
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, **kwargs):
+    if created:
+        UserStats.objects.bump(instance.author_id, comments_count=1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    UserStats.objects.bump(instance.author_id, comments_count=-1)
+
+
+@receiver(post_save, sender=Follow)
+def count_new_follow(sender, instance, created, **kwargs):
+    if created:
+        UserStats.objects.bump(instance.author_id, followers_count=1)
+        UserStats.objects.bump(instance.user_id, following_count=1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    UserStats.objects.bump(instance.author_id, followers_count=-1)
+    UserStats.objects.bump(instance.user_id, following_count=-1)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, **kwargs):
+    if created:
+        timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_timeline(sender, instance, **kwargs):
+    timeline.prune(instance.user_id, instance.author_id)
+
+
+@receiver(pre_save, sender=Post)
+def remember_previous_post(sender, instance, **kwargs):
+    previous = None
+    if instance.pk is not None:
+        previous = Post.objects.filter(pk=instance.pk).values_list(
+            'group__slug', 'image').first()
+    instance._previous_group_slug, instance._previous_image = (
+        previous or (None, ''))
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def expire_post_feeds(sender, instance, **kwargs):
+    feed_cache.bump('responses')
+    feed_cache.bump('index')
+    feed_cache.bump('profile', instance.author.username)
+    slugs = {getattr(instance, '_previous_group_slug', None)}
+    if instance.group_id is not None:
+        slugs.add(instance.group.slug)
+    for slug in slugs - {None}:
+        feed_cache.bump('group', slug)
+
+
+# Поля пользователя, которые видны в карточках его постов.
+DISPLAYED_USER_FIELDS = ('username', 'first_name', 'last_name')
+
+
+def changes_displayed_fields(update_fields):
+    return update_fields is None or bool(
+        set(update_fields) & set(DISPLAYED_USER_FIELDS))
+
+
+@receiver(pre_save, sender=User)
+def remember_previous_user(sender, instance, update_fields=None, **kwargs):
+    previous = None
+    if instance.pk is not None and changes_displayed_fields(update_fields):
+        previous = User.objects.filter(pk=instance.pk).values_list(
+            *DISPLAYED_USER_FIELDS).first()
+    instance._previous_names = previous
+
+
+@receiver(post_save, sender=User)
+def expire_author_feeds(sender, instance, created, update_fields=None,
+                        **kwargs):
+    # Новый пользователь ещё нигде не показан, а вход, смена пароля и
+    # прочие поля не меняют карточек.
+    if created or not changes_displayed_fields(update_fields):
+        return
+    names = tuple(getattr(instance, field) for field in DISPLAYED_USER_FIELDS)
+    if getattr(instance, '_previous_names', None) != names:
+        feed_cache.bump_all()
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def expire_group_feeds(sender, instance, **kwargs):
+    feed_cache.bump_all()
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def expire_comment_responses(sender, instance, **kwargs):
+    feed_cache.bump('responses')
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def expire_follower_pages(sender, instance, **kwargs):
+    feed_cache.bump('user', instance.user_id)
+
+
+def adjust_feed_counts(post, group_slug, delta):
+    paginators.adjust_count('index', delta)
+    paginators.adjust_count(f'profile:{post.author.username}', delta)
+    if group_slug is not None:
+        paginators.adjust_count(f'group:{group_slug}', delta)
+
+
+@receiver(post_save, sender=Post)
+def count_feed_post(sender, instance, created, **kwargs):
+    group_slug = instance.group.slug if instance.group_id else None
+    if created:
+        adjust_feed_counts(instance, group_slug, 1)
+        return
+    previous_slug = getattr(instance, '_previous_group_slug', None)
+    if previous_slug != group_slug:
+        for slug, delta in ((previous_slug, -1), (group_slug, 1)):
+            if slug is not None:
+                paginators.adjust_count(f'group:{slug}', delta)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_feed_post(sender, instance, **kwargs):
+    group_slug = instance.group.slug if instance.group_id else None
+    adjust_feed_counts(instance, group_slug, -1)
+
+
+@receiver(post_save, sender=Post)
+def prepare_thumbnails(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_image', '')
+    if instance.image and instance.image.name != previous:
+        name = instance.image.name
+        transaction.on_commit(lambda: thumbnails.schedule(name))
+
+
+@receiver(post_save, sender=Post)
+def count_image_references(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_image', '')
+    current = instance.image.name or ''
+    if previous == current:
+        return
+    if current:
+        ImageBlob.objects.bump(current, 1)
+    if previous:
+        ImageBlob.objects.bump(previous, -1)
+
+
+@receiver(post_delete, sender=Post)
+def release_image(sender, instance, **kwargs):
+    if instance.image:
+        ImageBlob.objects.bump(instance.image.name, -1)
@@ -0,0 +1,33 @@
+import hashlib
+import posixpath
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentHashStorage(FileSystemStorage):
+    """
+    Хранилище, которое называет файлы по SHA-256 содержимого.
+
+    Каталог из upload_to сохраняется, имя заменяется хэшем:
+    `posts/ab/ab12….jpg`. Одинаковые загрузки ложатся в один файл,
+    поэтому и превью sorl у них общие.
+    """
+
+    def _save(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        hexdigest = digest.hexdigest()
+        directory, filename = posixpath.split(name)
+        extension = posixpath.splitext(filename)[1].lower()
+        name = posixpath.join(directory, hexdigest[:2], hexdigest + extension)
+        # Строка файла обновляется до проверки exists(): если сборщик
+        # collect_image_blobs как раз удаляет файл, запись дождётся конца
+        # его транзакции и увидит, что файла уже нет.
+        from .models import ImageBlob
+        ImageBlob.objects.touch(name)
+        if self.exists(name):
+            return name
+        return super()._save(name, content)
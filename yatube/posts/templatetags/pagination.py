@@ -0,0 +1,23 @@
+from django import template
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def cursor_url(context, page, direction):
+    """Ссылка на соседнюю страницу ленты по курсору."""
+    paginator = page.paginator
+    if direction == 'previous':
+        cursor = paginator.previous_cursor(page)
+    else:
+        cursor = paginator.next_cursor(page)
+    query = context['request'].GET.copy()
+    query.pop('page', None)
+    query['cursor'] = cursor
+    return f'?{query.urlencode()}'
+
+
+@register.simple_tag
+def page_window(page):
+    """Окно номеров страниц вокруг текущей."""
+    return page.paginator.page_window(page.number)
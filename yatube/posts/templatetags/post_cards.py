@@ -0,0 +1,50 @@
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from posts import feed_cache, thumbnails
+
+register = template.Library()
+
+CARD_KEY = 'post_card:{}:{}:{}'
+CARDS = 'post_cards'
+
+
+def card_key(post, version):
+    return CARD_KEY.format(post.pk, post.updated_at.timestamp(), version)
+
+
+@register.simple_tag(takes_context=True)
+def prefetch_post_cards(context, posts):
+    """
+    Достаёт готовые карточки страницы одним запросом к кэшу, а превью
+    для карточек, которые придётся рендерить, — одной пачкой.
+    """
+    version = feed_cache.version('cards')
+    keys = {post.pk: card_key(post, version) for post in posts}
+    cards = cache.get_many(keys.values())
+    prefetched = thumbnails.prefetch(
+        post.image for post in posts if keys[post.pk] not in cards)
+    context.render_context[CARDS] = (version, cards, prefetched)
+    return ''
+
+
+@register.simple_tag(takes_context=True)
+def post_card(context, post):
+    """Карточка поста из кэша; при промахе рендерится и кэшируется."""
+    version, cards, prefetched = (
+        context.render_context.get(CARDS) or (None, {}, None))
+    if version is None:
+        version = feed_cache.version('cards')
+    key = card_key(post, version)
+    html = cards.get(key)
+    if html is None:
+        html = render_to_string(
+            'posts/includes/post_card.html',
+            {'post': post, 'thumbnails': prefetched},
+        )
+        cache.set(key, html, settings.POST_CARD_CACHE_TIMEOUT)
+        cards[key] = html
+    return mark_safe(html)
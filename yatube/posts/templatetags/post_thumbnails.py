@@ -0,0 +1,13 @@
+from django import template
+
+from posts import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def image_variants(context, post):
+    """Превью картинки поста со srcset и размерами для <img>."""
+    if not post.image:
+        return None
+    return thumbnails.variants(post, prefetched=context.get('thumbnails'))
@@ -0,0 +1,97 @@
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Group, Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+class AdminChangelistTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass')
+        cls.groups = Group.objects.bulk_create(
+            Group(title=f'Группа {i}', slug=f'group_{i}', description='-')
+            for i in range(3)
+        )
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.admin)
+
+    def create_rows(self, count):
+        groups = list(Group.objects.all())
+        for i in range(count):
+            post = Post.objects.create(
+                author=self.admin, text=f'Пост {i}',
+                group=groups[i % len(groups)])
+            Comment.objects.create(post=post, author=self.admin, text='Ок')
+
+    def changelist_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(url))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_queries_do_not_grow_with_rows(self):
+        """Число запросов списка не зависит от числа строк."""
+        for url in ('admin:posts_post_changelist',
+                    'admin:posts_comment_changelist'):
+            with self.subTest(url=url):
+                Post.objects.all().delete()
+                self.create_rows(2)
+                few = self.changelist_queries(url)
+                self.create_rows(10)
+                self.assertEqual(self.changelist_queries(url), few)
+
+    @override_settings(ADMIN_COUNT_LIMIT=5)
+    def test_count_is_limited(self):
+        """Больше порога записи не пересчитываются."""
+        self.create_rows(8)
+        response = self.client.get(reverse('admin:posts_post_changelist'))
+        self.assertEqual(response.context['cl'].result_count, 5)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class AdminPostFormTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_uploaded_image_is_normalized(self):
+        """Картинка из админки получает размеры, как и с сайта."""
+        admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass')
+        client = Client()
+        client.force_login(admin)
+        response = client.post(reverse('admin:posts_post_add'), {
+            'text': 'Пост из админки',
+            'author': admin.pk,
+            'image': SimpleUploadedFile(
+                'small.gif', SMALL_GIF, content_type='image/gif'),
+        })
+        self.assertEqual(response.status_code, 302)
+        post = Post.objects.get()
+        self.assertEqual((post.image_width, post.image_height), (2, 1))
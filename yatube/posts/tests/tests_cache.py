@@ -1,8 +1,10 @@
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.test import Client, SimpleTestCase, TestCase, override_settings
 from django.urls import reverse
 from django.core.cache import cache
 
+from posts import feed_cache
+from posts.checks import TIMEOUT_SETTINGS, check_shared_cache
 from posts.models import Group, Post
 
 User = get_user_model()
@@ -33,11 +35,136 @@ class CacheTests(TestCase):
         """Проверка работоспособности кэш."""
         response = self.authorized_client.get(reverse('posts:index'))
         cache_save = response.content
-        self.post.delete()
+        Post.objects.filter(pk=self.post.pk).update(text='Без сигналов')
         response = self.authorized_client.get(reverse('posts:index'))
-        cache_after_del = response.content
-        self.assertEqual(cache_after_del, cache_save)
+        cache_after_update = response.content
+        self.assertEqual(cache_after_update, cache_save)
         cache.clear()
         response = self.authorized_client.get(reverse('posts:index'))
         cache_afte_clear = response.content
         self.assertNotEqual(cache_afte_clear, cache_save)
+
+    def test_cache_expires_on_post_changes(self):
+        """Кэш лент сбрасывается при создании и удалении поста."""
+        pages = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile',
+                    kwargs={'username': self.post.author.username}),
+        )
+        for page in pages:
+            self.guest_client.get(page)
+        post = Post.objects.create(
+            text='Новый пост', author=self.post.author, group=self.group)
+        for page in pages:
+            with self.subTest(page=page):
+                response = self.guest_client.get(page)
+                self.assertContains(response, 'Новый пост')
+        post.delete()
+        for page in pages:
+            with self.subTest(page=page):
+                response = self.guest_client.get(page)
+                self.assertNotContains(response, 'Новый пост')
+
+    def test_cache_is_page_aware(self):
+        """Разные страницы ленты кэшируются отдельно."""
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=self.user) for i in range(12))
+        # bulk_create не шлёт сигналов, кэш лент сбрасываем вручную.
+        cache.clear()
+        first = self.guest_client.get(reverse('posts:index'))
+        second = self.guest_client.get(reverse('posts:index') + '?page=2')
+        self.assertNotEqual(first.content, second.content)
+
+
+class AnonymousCacheMiddlewareTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        self.post = Post.objects.create(text='Текст', author=self.author)
+        self.guest_client = Client()
+
+    def test_anonymous_responses_are_cached(self):
+        """Повторный запрос анонима отдаётся из кэша."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        first = self.guest_client.get(url)
+        second = self.guest_client.get(url)
+        self.assertEqual(first['X-Cache'], 'MISS')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(first.content, second.content)
+        other_page = self.guest_client.get(url + '?page=2')
+        self.assertEqual(other_page['X-Cache'], 'MISS')
+
+    def test_authorized_responses_are_not_cached(self):
+        """Пользователи с сессией кэшем ответов не обслуживаются."""
+        client = Client()
+        client.force_login(self.author)
+        client.get(reverse('posts:index'))
+        response = client.get(reverse('posts:index'))
+        self.assertFalse(response.has_header('X-Cache'))
+
+    def test_cached_response_expires_on_comment(self):
+        """Новый комментарий сбрасывает закэшированную страницу поста."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        self.guest_client.get(url)
+        self.post.comments.create(author=self.author, text='Комментарий')
+        response = self.guest_client.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertContains(response, 'Комментарий')
+
+
+class PostCardCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.group = Group.objects.create(
+            title='Группа', slug='cards', description='Описание')
+        self.author = User.objects.create_user(username='author')
+        self.post = Post.objects.create(
+            text='Старый текст', author=self.author, group=self.group)
+        self.client = Client()
+        self.client.force_login(self.author)
+
+    def test_card_is_shared_between_feeds(self):
+        """Карточка, отрисованная в одной ленте, берётся из кэша в другой."""
+        self.client.get(reverse('posts:index'))
+        Post.objects.filter(pk=self.post.pk).update(text='Новый текст')
+        response = self.client.get(
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}))
+        self.assertContains(response, 'Старый текст')
+
+    def test_card_expires_on_post_save(self):
+        """Изменённый пост получает новую карточку."""
+        self.client.get(reverse('posts:index'))
+        self.post.text = 'Новый текст'
+        self.post.save()
+        response = self.client.get(
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}))
+        self.assertContains(response, 'Новый текст')
+
+    def test_only_displayed_user_fields_expire_cards(self):
+        """Регистрация и смена пароля не сбрасывают кэши, смена имени — да."""
+        before = feed_cache.generations(feed_cache.ALL_FEEDS)
+        User.objects.create_user(username='newcomer')
+        self.author.set_password('другой пароль')
+        self.author.save()
+        self.assertEqual(feed_cache.generations(feed_cache.ALL_FEEDS), before)
+        self.author.first_name = 'Автор'
+        self.author.save()
+        self.assertNotEqual(
+            feed_cache.generations(feed_cache.ALL_FEEDS), before)
+
+
+class SharedCacheCheckTests(SimpleTestCase):
+    def test_locmem_with_long_timeouts_is_refused(self):
+        """check --deploy не пропускает долгие сроки при LocMemCache."""
+        errors = check_shared_cache(None)
+        self.assertEqual(
+            {error.id for error in errors}, {'posts.E001'})
+        self.assertEqual(len(errors), len(TIMEOUT_SETTINGS))
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': '/tmp/yatube-cache',
+    }})
+    def test_shared_cache_passes(self):
+        self.assertEqual(check_shared_cache(None), [])
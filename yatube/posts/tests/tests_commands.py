@@ -0,0 +1,192 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from PIL import Image
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from posts import thumbnails
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ExplainFeedsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='explain_user')
+        cls.group = Group.objects.create(
+            title='Группа',
+            slug='explain_slug',
+            description='Описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user, text='Текст', group=cls.group)
+        Comment.objects.create(post=cls.post, author=cls.user, text='Текст')
+        Follow.objects.create(
+            user=User.objects.create_user(username='reader'),
+            author=cls.user,
+        )
+
+    def test_feeds_use_indexes(self):
+        """Запросы лент не читают таблицы целиком."""
+        out = StringIO()
+        call_command('explain_feeds', stdout=out)
+        for feed in ('index', 'group_posts', 'profile',
+                     'follow_index', 'comments'):
+            with self.subTest(feed=feed):
+                self.assertIn(feed, out.getvalue())
+        self.assertNotIn('полный скан', out.getvalue())
+
+
+class BenchmarkTimelinesTest(TestCase):
+
+    def test_benchmark_rolls_back(self):
+        """Бенчмарк лент сравнивает три стратегии и ничего не оставляет."""
+        out = StringIO()
+        call_command('benchmark_timelines', readers=10, authors=4,
+                     follows=2, posts=1, stdout=out)
+        for strategy in ('push', 'pull', 'hybrid'):
+            with self.subTest(strategy=strategy):
+                self.assertIn(strategy, out.getvalue())
+        self.assertFalse(User.objects.exists())
+
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class BackfillImageDimensionsTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_dimensions_are_read_from_files(self):
+        """Команда заполняет размеры картинок, загруженных без них."""
+        buffer = io.BytesIO()
+        Image.new('RGB', (30, 20)).save(buffer, 'PNG')
+        author = User.objects.create_user(username='old_uploader')
+        post = Post.objects.create(
+            author=author, text='Старый пост',
+            image=SimpleUploadedFile('old.png', buffer.getvalue()),
+        )
+        broken = Post.objects.create(
+            author=author, text='Битая картинка', image='posts/missing.png')
+        call_command('backfill_image_dimensions', workers=2,
+                     stdout=StringIO())
+        post.refresh_from_db()
+        broken.refresh_from_db()
+        self.assertEqual((post.image_width, post.image_height), (30, 20))
+        self.assertIsNone(broken.image_width)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class WarmThumbnailsTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_thumbnails_are_warmed_from_checkpoint(self):
+        """Команда готовит превью и продолжает с контрольной точки."""
+        author = User.objects.create_user(username='warm_author')
+        posts = []
+        for color in ('red', 'blue'):
+            buffer = io.BytesIO()
+            Image.new('RGB', (30, 20), color).save(buffer, 'PNG')
+            posts.append(Post.objects.create(
+                author=author, text=color,
+                image=SimpleUploadedFile(f'{color}.png', buffer.getvalue()),
+            ))
+        first, second = posts
+        default.kvstore.delete_thumbnails(ImageFile(first.image.name))
+        default.kvstore.delete_thumbnails(ImageFile(second.image.name))
+        checkpoint = os.path.join(TEMP_MEDIA_ROOT, 'warm.json')
+        with open(checkpoint, 'w') as file:
+            json.dump({'last_pk': first.pk}, file)
+        out = StringIO()
+        call_command('warm_thumbnails', workers=0, checkpoint=checkpoint,
+                     stdout=out)
+        self.assertIn('Готово: 1', out.getvalue())
+        geometry, options = thumbnails.POST_THUMBNAIL
+        self.assertIsNone(thumbnails.cached_thumbnail(
+            first.image.name, geometry, **options))
+        self.assertIsNotNone(thumbnails.cached_thumbnail(
+            second.image.name, geometry, **options))
+        call_command('warm_thumbnails', workers=0, checkpoint=checkpoint,
+                     restart=True, stdout=StringIO())
+        self.assertIsNotNone(thumbnails.cached_thumbnail(
+            first.image.name, geometry, **options))
+        with open(checkpoint) as file:
+            self.assertEqual(json.load(file), {'last_pk': second.pk})
+
+
+class ImportContentTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.reader = User.objects.create_user(username='reader')
+        self.group = Group.objects.create(
+            title='Импорт', slug='imported', description='-')
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        return path
+
+    def test_jsonl_import_keeps_dates_and_rebuilds(self):
+        """Импорт сохраняет даты и пересчитывает счётчики и ленты."""
+        records = [
+            {'type': 'follow', 'user': 'reader', 'author': 'writer'},
+            {'type': 'post', 'ref': 'p1', 'author': 'writer',
+             'text': 'Старый пост', 'pub_date': '2015-03-01T10:00:00+00:00',
+             'group': 'imported'},
+            {'type': 'comment', 'post': 'p1', 'author': 'reader',
+             'text': 'Старый комментарий', 'created': '2015-03-02T10:00:00'},
+            {'type': 'post', 'author': 'ghost', 'text': 'Без автора'},
+        ]
+        path = self.write('content.jsonl', '\n'.join(
+            json.dumps(record, ensure_ascii=False) for record in records))
+        out, err = StringIO(), StringIO()
+        call_command('import_content', path, create_users=True,
+                     batch_size=2, stdout=out, stderr=err)
+        post = Post.objects.get(text='Старый пост')
+        self.assertEqual(post.pub_date.year, 2015)
+        self.assertEqual(post.updated_at, post.pub_date)
+        self.assertEqual(post.group, self.group)
+        self.assertEqual(post.comments.get().created.day, 2)
+        self.assertEqual(post.author.stats.posts_count, 1)
+        self.assertEqual(post.author.stats.followers_count, 1)
+        self.assertTrue(
+            self.reader.timeline.filter(post=post).exists())
+        self.assertTrue(Post.objects.filter(text='Без автора').exists())
+
+    def test_csv_import_skips_unknown_users(self):
+        """Без --create-users записи неизвестных авторов пропускаются."""
+        path = self.write(
+            'content.csv',
+            'type,ref,author,text,pub_date,group,post,user\n'
+            'post,1,reader,Пост читателя,2019-01-01 12:00,,,\n'
+            'post,2,nobody,Чужой пост,,,,\n'
+            'comment,,reader,Ответ,,,1,\n'
+        )
+        err = StringIO()
+        call_command('import_content', path, stdout=StringIO(), stderr=err)
+        self.assertEqual(Post.objects.count(), 1)
+        self.assertEqual(Comment.objects.count(), 1)
+        self.assertIn('Запись 2 пропущена', err.getvalue())
+        created = Post.objects.create(author=self.reader, text='Новый')
+        imported = Post.objects.get(text='Пост читателя')
+        self.assertGreater(created.pk, imported.pk)
@@ -1,9 +1,12 @@
 from http import HTTPStatus
+from io import StringIO
+
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
-from posts.models import Group, Post, Follow
+from posts.models import Group, Post, Follow, TimelineEntry
 
 
 User = get_user_model()
@@ -127,3 +130,55 @@ class FollowerTests(TestCase):
         self.assertRedirects(response, reverse(
             'posts:profile', args={self.post.author}), HTTPStatus.FOUND)
         self.assertEqual(Follow.objects.count(), follow_count)
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='TimelineAuthor')
+        cls.reader = User.objects.create_user(username='TimelineReader')
+
+    def test_new_post_is_fanned_out(self):
+        """Новый пост попадает в ленту подписчика при публикации."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(text='Свежий', author=self.author)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=post).exists())
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        """Подписка наполняет ленту, отписка её очищает."""
+        Post.objects.create(text='Старый', author=self.author)
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.reader.timeline.count(), 1)
+        Follow.objects.filter(user=self.reader, author=self.author).delete()
+        self.assertEqual(self.reader.timeline.count(), 0)
+
+    @override_settings(TIMELINE_MAX_ENTRIES=3)
+    def test_timeline_is_capped(self):
+        """trim_timelines оставляет в ленте TIMELINE_MAX_ENTRIES постов."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        other = User.objects.create_user(username='other_reader')
+        Follow.objects.create(user=other, author=self.author)
+        posts = [
+            Post.objects.create(text=f'Пост {i}', author=self.author)
+            for i in range(5)
+        ]
+        # Публикация ленты не обрезает.
+        self.assertEqual(self.reader.timeline.count(), 5)
+        call_command('trim_timelines', batch_size=1, stdout=StringIO())
+        for user in (self.reader, other):
+            with self.subTest(user=user.username):
+                kept = set(user.timeline.values_list('post_id', flat=True))
+                self.assertEqual(kept, {post.pk for post in posts[-3:]})
+
+    @override_settings(TIMELINE_FANOUT_MAX_FOLLOWERS=0)
+    def test_popular_author_is_pulled(self):
+        """Посты популярного автора не раскладываются, а подмешиваются."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(text='Для всех', author=self.author)
+        self.assertFalse(self.reader.timeline.exists())
+        client = Client()
+        client.force_login(self.reader)
+        response = client.get(reverse('posts:follow_index'))
+        self.assertEqual(list(response.context['page_obj']), [post])
@@ -1,15 +1,20 @@
+import io
 import shutil
+import struct
 import tempfile
 from http import HTTPStatus
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase, override_settings
+from django.core.files.uploadhandler import SkipFile
+from django.test import Client, RequestFactory, TestCase, override_settings
 from django.urls.base import reverse
+from PIL import Image, TiffImagePlugin
 
 from posts.forms import PostForm
 from posts.models import Post, Comment
+from posts.uploadhandlers import LimitedUploadHandler
 
 
 User = get_user_model()
@@ -98,6 +103,17 @@ class PostCreateFormTests(TestCase):
             ).exists()
         )
 
+    def test_edit_post_updates_timestamp(self):
+        """Редактирование сдвигает updated_at, но не дату публикации"""
+        before = Post.objects.get(pk=self.post.pk)
+        self.authorized_client.post(
+            reverse('posts:post_edit', args={self.post.pk}),
+            data={'text': 'текст_три'},
+        )
+        after = Post.objects.get(pk=self.post.pk)
+        self.assertEqual(after.pub_date, before.pub_date)
+        self.assertGreater(after.updated_at, before.updated_at)
+
     def test_guest_client_create_post(self):
         """Проверка на редирект при попытке создания
         поста не авторизованным юзером
@@ -133,3 +149,119 @@ class PostCreateFormTests(TestCase):
         response = (self.authorized_client.
                     get(reverse('posts:post_detail', args={self.post.pk})))
         self.assertEqual(response.context['comments'][0], self.comment)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class PostImageNormalizationTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='Photographer')
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def get_jpeg(self, size, orientation=None):
+        image = Image.new('RGB', size, color=(200, 10, 10))
+        exif = Image.Exif()
+        if orientation:
+            exif[0x0112] = orientation
+        buffer = io.BytesIO()
+        image.save(buffer, 'JPEG', exif=exif.tobytes())
+        return SimpleUploadedFile(
+            'photo.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+    def get_mpo(self, size, orientation):
+        """Двухкадровый MPO, как у камер телефонов, с поворотом и GPS."""
+        exif = Image.Exif()
+        exif[0x0112] = orientation
+        exif[0x8825] = {1: 'N', 2: (TiffImagePlugin.IFDRational(55, 1),) * 3}
+        frames = []
+        for frame_exif in (exif, Image.Exif()):
+            buffer = io.BytesIO()
+            Image.new('RGB', size, color=(200, 10, 10)).save(
+                buffer, 'JPEG', exif=frame_exif.tobytes())
+            frames.append(buffer.getvalue())
+        first, second = frames
+
+        def mpf_segment(first_size, second_offset):
+            # Заголовок MP: IFD с версией, числом кадров и их таблицей.
+            entries = struct.pack(
+                '<IIIHHIIIHH', 0x20030000, first_size, 0, 0, 0,
+                0, len(second), second_offset, 0, 0)
+            ifd = struct.pack(
+                '<HHHI4sHHIIHHIII', 3, 0xB000, 7, 4, b'0100',
+                0xB001, 4, 1, 2, 0xB002, 7, 32, 50, 0)
+            payload = b'MPF\0II*\0' + struct.pack('<I', 8) + ifd + entries
+            return b'\xff\xe2' + struct.pack('>H', len(payload) + 2) + payload
+
+        first_size = len(first) + len(mpf_segment(0, 0))
+        # Смещения кадров отсчитываются от заголовка TIFF внутри APP2.
+        data = (first[:2] + mpf_segment(first_size, first_size - 10)
+                + first[2:] + second)
+        return SimpleUploadedFile(
+            'photo.jpg', data, content_type='image/jpeg')
+
+    @override_settings(POST_IMAGE_MAX_SIDE=100)
+    def test_image_is_rotated_downscaled_and_stripped(self):
+        """Картинка поворачивается по EXIF, уменьшается и теряет EXIF"""
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Фото', 'image': self.get_jpeg((400, 200), 6)},
+        )
+        post = Post.objects.get(text='Фото')
+        self.assertEqual((post.image_width, post.image_height), (50, 100))
+        with Image.open(post.image.path) as stored:
+            self.assertEqual(stored.size, (50, 100))
+            self.assertEqual(len(stored.getexif()), 0)
+
+    @override_settings(POST_IMAGE_MAX_SIDE=100)
+    def test_mpo_is_stored_as_clean_jpeg(self):
+        """Многокадровый MPO с камеры обрабатывается как обычный JPEG"""
+        upload = self.get_mpo((400, 200), 6)
+        with Image.open(upload) as original:
+            self.assertEqual(original.format, 'MPO')
+            self.assertTrue(original.is_animated)
+        upload.seek(0)
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Фото с телефона', 'image': upload},
+        )
+        post = Post.objects.get(text='Фото с телефона')
+        self.assertEqual((post.image_width, post.image_height), (50, 100))
+        with Image.open(post.image.path) as stored:
+            self.assertEqual(stored.format, 'JPEG')
+            self.assertEqual(stored.size, (50, 100))
+            self.assertEqual(len(stored.getexif()), 0)
+
+    def test_oversized_upload_is_dropped_while_streaming(self):
+        """Файл больше бюджета отбрасывается, не дочитавшись до конца"""
+        image = self.get_jpeg((400, 200))
+        limit = image.size // 2
+        handler = LimitedUploadHandler(RequestFactory().post('/'))
+        handler.new_file('image', 'photo.jpg', 'image/jpeg', image.size)
+        with override_settings(POST_IMAGE_MAX_BYTES=limit):
+            chunk = b'x' * limit
+            self.assertEqual(handler.receive_data_chunk(chunk, 0), chunk)
+            with self.assertRaises(SkipFile):
+                handler.receive_data_chunk(b'x', limit)
+        self.assertEqual(handler.request.oversized_uploads, {'image'})
+        with override_settings(POST_IMAGE_MAX_BYTES=limit):
+            response = self.authorized_client.post(
+                reverse('posts:post_create'),
+                data={'text': 'Тяжёлое фото', 'image': image},
+            )
+        self.assertFalse(Post.objects.filter(text='Тяжёлое фото').exists())
+        self.assertTrue(response.context['form'].has_error('image'))
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=100)
+    def test_image_over_pixel_budget_is_rejected(self):
+        """Картинка больше пиксельного бюджета не принимается"""
+        response = self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Большое фото', 'image': self.get_jpeg((20, 20))},
+        )
+        self.assertFalse(Post.objects.filter(text='Большое фото').exists())
+        self.assertTrue(response.context['form'].has_error('image'))
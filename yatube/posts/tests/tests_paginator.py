@@ -0,0 +1,128 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Post
+from posts.paginators import CursorPage, KeysetPaginator
+
+User = get_user_model()
+
+
+class KeysetPaginatorTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='keyset_user')
+        Post.objects.bulk_create(
+            Post(author=cls.user, text=f'Пост {i}') for i in range(25)
+        )
+        cls.expected = list(
+            Post.objects.order_by('-pub_date', '-id').values_list(
+                'id', flat=True)
+        )
+
+    def setUp(self):
+        self.paginator = KeysetPaginator(Post.objects.all(), 10)
+
+    def ids(self, page):
+        return [post.id for post in page]
+
+    def test_cursor_pages_follow_offset_pages(self):
+        """Курсор листает ленту так же, как номера страниц."""
+        first = self.paginator.get_page(1)
+        second = self.paginator.cursor_page(self.paginator.next_cursor(first))
+        third = self.paginator.cursor_page(
+            self.paginator.next_cursor(second))
+        self.assertEqual(self.ids(first), self.expected[:10])
+        self.assertEqual(self.ids(second), self.expected[10:20])
+        self.assertEqual(self.ids(third), self.expected[20:])
+        self.assertTrue(second.has_previous())
+        self.assertTrue(second.has_next())
+        self.assertFalse(third.has_next())
+
+    def test_previous_cursor(self):
+        """Курсор назад возвращает предыдущую страницу."""
+        first = self.paginator.get_page(1)
+        second = self.paginator.cursor_page(self.paginator.next_cursor(first))
+        back = self.paginator.cursor_page(
+            self.paginator.previous_cursor(second))
+        self.assertEqual(self.ids(back), self.expected[:10])
+        self.assertFalse(back.has_previous())
+        self.assertTrue(back.has_next())
+
+    def test_cursor_page_does_not_count(self):
+        """Страница по курсору обходится одним запросом без COUNT(*)."""
+        token = self.paginator.next_cursor(self.paginator.get_page(1))
+        with CaptureQueriesContext(connection) as queries:
+            page = self.paginator.cursor_page(token)
+            self.assertIsInstance(page, CursorPage)
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('COUNT', queries[0]['sql'].upper())
+
+    def test_broken_cursor_returns_first_page(self):
+        """Испорченный курсор не ломает страницу."""
+        page = self.paginator.cursor_page('not-a-cursor')
+        self.assertEqual(self.ids(page), self.expected[:10])
+
+    def test_page_numbers_are_limited(self):
+        """Номера страниц дальше max_page_number не выдаются."""
+        paginator = KeysetPaginator(Post.objects.all(), 5, max_page_number=2)
+        self.assertEqual(list(paginator.page_range), [1, 2])
+        self.assertEqual(paginator.get_page(5).number, 2)
+
+    def test_index_cursor_link(self):
+        """Лента отдаёт страницу по курсору из ссылки пагинатора."""
+        cache.clear()
+        token = self.paginator.next_cursor(self.paginator.get_page(1))
+        response = Client().get(reverse('posts:index'), {'cursor': token})
+        self.assertEqual(
+            self.ids(response.context['page_obj']), self.expected[10:20])
+
+
+class CachedCountTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='count_user')
+        Post.objects.bulk_create(
+            Post(author=cls.user, text=f'Пост {i}') for i in range(5)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def paginator(self):
+        return KeysetPaginator(Post.objects.all(), 2, count_key='index')
+
+    def test_count_is_cached_and_adjusted_on_write(self):
+        """Число записей берётся из кэша и поправляется сигналами."""
+        self.assertEqual(self.paginator().count, 5)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.paginator().count, 5)
+        Post.objects.create(author=self.user, text='Новый пост')
+        self.assertEqual(self.paginator().count, 6)
+        Post.objects.filter(text='Новый пост').delete()
+        self.assertEqual(self.paginator().count, 5)
+
+    @override_settings(PAGINATOR_APPROXIMATE_COUNT=3)
+    def test_large_count_is_approximate(self):
+        """Большое число записей показывается приблизительно."""
+        Post.objects.bulk_create(
+            Post(author=self.user, text='Пост') for _ in range(1230))
+        paginator = self.paginator()
+        self.assertTrue(paginator.is_approximate)
+        self.assertEqual(paginator.display_count, 1200)
+
+    def test_page_window_is_bounded(self):
+        """Окно страниц ограничено соседями текущей и краями."""
+        paginator = KeysetPaginator(
+            Post.objects.all(), 1, max_page_number=100)
+        paginator.count = 100
+        self.assertEqual(
+            paginator.page_window(50),
+            [1, None, 48, 49, 50, 51, 52, None, 100],
+        )
+        self.assertEqual(paginator.page_window(2), [1, 2, 3, 4, None, 100])
@@ -0,0 +1,93 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts import search
+from posts.models import Comment, Post
+from posts.paginators import KeysetPaginator
+
+User = get_user_model()
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='searcher')
+        cls.relevant = Post.objects.create(
+            author=cls.author, text='Котики, котики и ещё раз котики')
+        cls.mention = Post.objects.create(
+            author=cls.author,
+            text='Длинный пост про погоду, где котики упомянуты однажды, '
+                 'а дальше речь идёт о дожде, ветре и снеге')
+        cls.other = Post.objects.create(author=cls.author, text='Про собак')
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_results_are_ranked(self):
+        """Поиск находит слова по префиксу и ставит релевантное выше."""
+        response = self.guest_client.get(
+            reverse('posts:search'), {'q': 'котик'})
+        self.assertEqual(
+            list(response.context['page_obj']), [self.relevant, self.mention])
+
+    def test_posts_are_found_by_comments(self):
+        """Пост находится и по комментарию, но ниже постов с этим словом."""
+        Comment.objects.create(
+            post=self.other, author=self.author, text='А у меня котики')
+        Comment.objects.create(
+            post=self.relevant, author=self.author, text='Котики!')
+        response = self.guest_client.get(
+            reverse('posts:search'), {'q': 'котик'})
+        self.assertEqual(
+            list(response.context['page_obj']),
+            [self.relevant, self.mention, self.other])
+
+    def test_query_without_words(self):
+        """Запрос из одних знаков препинания даёт пустую выдачу, а не 500."""
+        for query in ('"', '***', '  -  '):
+            with self.subTest(query=query):
+                response = self.guest_client.get(
+                    reverse('posts:search'), {'q': query})
+                self.assertEqual(response.status_code, 200)
+                self.assertFalse(list(response.context['page_obj']))
+
+    def test_index_follows_changes(self):
+        """Индекс следует за правкой, удалением и bulk_create."""
+        Post.objects.filter(pk=self.other.pk).update(text='Про попугаев')
+        Post.objects.bulk_create([Post(author=self.author, text='Попугаи')])
+        Post.objects.filter(pk=self.relevant.pk).delete()
+        posts = search.matches(Post.objects.all(), 'попуга')
+        self.assertEqual(posts.count(), 2)
+        self.assertFalse(search.matches(Post.objects.all(), 'собак'))
+        self.assertFalse(search.matches(Post.objects.all(), 'раз котики'))
+
+    def test_cursor_pages(self):
+        """Результаты листаются курсором без повторов."""
+        paginator = KeysetPaginator(
+            search.ranked(Post.objects.all(), 'котики'), 1,
+            keys=('search_rank', 'id'))
+        first = paginator.cursor_page()
+        second = paginator.cursor_page(paginator.next_cursor(first))
+        self.assertEqual(list(first), [self.relevant])
+        self.assertEqual(list(second), [self.mention])
+        self.assertFalse(second.has_next())
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке по постам и комментариям идёт через индекс."""
+        Comment.objects.create(
+            post=self.other, author=self.author, text='Лают громко')
+        admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass')
+        self.guest_client.force_login(admin)
+        cases = (
+            ('admin:posts_post_changelist', 'котики', 2),
+            ('admin:posts_comment_changelist', 'лают', 1),
+        )
+        for url, query, count in cases:
+            with self.subTest(url=url):
+                response = self.guest_client.get(reverse(url), {'q': query})
+                self.assertEqual(response.context['cl'].result_count, count)
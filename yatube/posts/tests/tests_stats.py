@@ -0,0 +1,63 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Post, UserStats
+
+User = get_user_model()
+
+
+class UserStatsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='stats_author')
+        cls.reader = User.objects.create_user(username='stats_reader')
+
+    def stats(self, user):
+        return UserStats.objects.for_user(
+            User.objects.select_related('stats').get(pk=user.pk))
+
+    def test_post_and_comment_counters(self):
+        """Счётчики постов и комментариев следуют за созданием и удалением."""
+        post = Post.objects.create(author=self.author, text='Текст')
+        Post.objects.create(author=self.author, text='Текст')
+        Comment.objects.create(post=post, author=self.reader, text='Да')
+        self.assertEqual(self.stats(self.author).posts_count, 2)
+        self.assertEqual(self.stats(self.reader).comments_count, 1)
+        post.delete()
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.assertEqual(self.stats(self.reader).comments_count, 0)
+
+    def test_follow_counters(self):
+        """Подписка и отписка меняют счётчики обеих сторон."""
+        client = Client()
+        client.force_login(self.reader)
+        client.get(reverse('posts:profile_follow', args=[self.author]))
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        client.get(reverse('posts:profile_unfollow', args=[self.author]))
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.reader).following_count, 0)
+
+    def test_profile_reads_counter(self):
+        """Профиль берёт число постов из UserStats."""
+        Post.objects.create(author=self.author, text='Текст')
+        response = Client().get(
+            reverse('posts:profile', args=[self.author]))
+        self.assertEqual(response.context['sum_count'], 1)
+
+    def test_recount_repairs_drift(self):
+        """recount_user_stats исправляет разошедшиеся счётчики."""
+        Post.objects.bulk_create(
+            Post(author=self.author, text='Текст') for _ in range(3))
+        Follow.objects.bulk_create(
+            [Follow(user=self.reader, author=self.author)])
+        call_command('recount_user_stats', stdout=StringIO())
+        stats = self.stats(self.author)
+        self.assertEqual(stats.posts_count, 3)
+        self.assertEqual(stats.followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
@@ -0,0 +1,206 @@
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from sorl.thumbnail.kvstores import cached_db_kvstore
+
+from posts import feed_cache, thumbnails
+from posts.models import ImageBlob, Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(
+            text='Пост с картинкой',
+            author=User.objects.create_user(username='painter'),
+            image=SimpleUploadedFile(
+                'small.gif', SMALL_GIF, content_type='image/gif'),
+        )
+        self.url = reverse('posts:post_detail', args=[self.post.pk])
+        self.guest_client = Client()
+
+    def test_placeholder_until_thumbnail_is_ready(self):
+        """До фоновой генерации превью шаблон показывает заглушку."""
+        response = self.guest_client.get(self.url)
+        self.assertContains(response, 'img/placeholder.svg')
+        thumbnails.generate(self.post.image.name)
+        geometry, options = thumbnails.POST_THUMBNAILS[0]
+        thumbnail = thumbnails.cached_thumbnail(
+            self.post.image.name, geometry, **options)
+        self.assertIsNotNone(thumbnail)
+        response = self.guest_client.get(self.url)
+        self.assertNotContains(response, 'img/placeholder.svg')
+        self.assertContains(response, thumbnail.url)
+
+    def test_missing_thumbnail_is_not_remembered_long(self):
+        """Промах кэшируется ненадолго: превью из другого процесса видно."""
+        name = self.post.image.name
+        geometry, options = thumbnails.POST_THUMBNAILS[0]
+        self.assertIsNone(
+            thumbnails.cached_thumbnail(name, geometry, **options))
+        # Превью готовит другой процесс со своим кэшем.
+        other_cache = LocMemCache('other', {})
+        with mock.patch.object(
+                cached_db_kvstore.KVStore, 'cache', other_cache):
+            thumbnails.generate(name)
+        later = time.time() + settings.THUMBNAIL_MISS_TIMEOUT + 1
+        with mock.patch('time.time', return_value=later):
+            thumbnail = thumbnails.cached_thumbnail(
+                name, geometry, **options)
+        self.assertIsNotNone(thumbnail)
+
+    def test_ready_thumbnails_do_not_expire_site(self):
+        """Повторная генерация готовых превью не сбрасывает кэши."""
+        thumbnails.generate(self.post.image.name)
+        before = feed_cache.generations(
+            feed_cache.ALL_FEEDS, ('index', ''), ('responses', ''))
+        self.post.text = 'Новый текст'
+        with mock.patch('posts.signals.transaction.on_commit') as on_commit:
+            self.post.save()
+        on_commit.assert_not_called()
+        thumbnails.generate(self.post.image.name)
+        after = feed_cache.generations(feed_cache.ALL_FEEDS)
+        self.assertEqual(after, before.split('.')[0])
+
+    def test_new_thumbnails_expire_only_post_feeds(self):
+        """Готовые превью сбрасывают ленты поста, а не весь сайт."""
+        before = feed_cache.generations(feed_cache.ALL_FEEDS, ('index', ''))
+        updated_at = self.post.updated_at
+        thumbnails.generate(self.post.image.name)
+        after = feed_cache.generations(feed_cache.ALL_FEEDS, ('index', ''))
+        self.assertEqual(after.split('.')[0], before.split('.')[0])
+        self.assertNotEqual(after, before)
+        self.post.refresh_from_db()
+        self.assertGreater(self.post.updated_at, updated_at)
+
+    def test_card_lists_all_widths(self):
+        """Карточка выводит srcset по всем ширинам и ленивую загрузку."""
+        thumbnails.generate(self.post.image.name)
+        response = self.guest_client.get(reverse('posts:index'))
+        for width in settings.POST_THUMBNAIL_WIDTHS:
+            with self.subTest(width=width):
+                self.assertContains(response, f' {width}w')
+        self.assertContains(response, 'loading="lazy"')
+
+    def test_page_thumbnails_are_read_in_one_query(self):
+        """Превью всей страницы читаются из базы одним запросом."""
+        for i in range(3):
+            post = Post.objects.create(
+                text=f'Ещё пост {i}',
+                author=self.post.author,
+                image=SimpleUploadedFile(
+                    f'small{i}.gif', SMALL_GIF, content_type='image/gif'),
+            )
+            thumbnails.generate(post.image.name)
+        thumbnails.generate(self.post.image.name)
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.guest_client.get(reverse('posts:index'))
+        kvstore_queries = [
+            query for query in queries
+            if 'thumbnail_kvstore' in query['sql']
+        ]
+        self.assertEqual(len(kvstore_queries), 1)
+        self.assertNotContains(response, 'img/placeholder.svg')
+
+    def test_detail_thumbnails_are_read_in_one_query(self):
+        """Все варианты превью на странице поста читаются одним запросом."""
+        thumbnails.generate(self.post.image.name)
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.guest_client.get(self.url)
+        kvstore_queries = [
+            query for query in queries
+            if 'thumbnail_kvstore' in query['sql']
+        ]
+        self.assertEqual(len(kvstore_queries), 1)
+        self.assertNotContains(response, 'img/placeholder.svg')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ContentHashStorageTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='memes')
+
+    def create_post(self, text):
+        return Post.objects.create(
+            text=text, author=self.author,
+            image=SimpleUploadedFile('meme.gif', SMALL_GIF))
+
+    def test_identical_uploads_share_one_file(self):
+        """Одинаковые картинки хранятся одним файлом со счётчиком ссылок."""
+        first = self.create_post('Первый')
+        second = self.create_post('Второй')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertTrue(first.image.name.startswith('posts/'))
+        blob = ImageBlob.objects.get(name=first.image.name)
+        self.assertEqual(blob.references, 2)
+
+    def test_orphaned_files_are_collected(self):
+        """Файл без ссылок удаляется командой после срока ожидания."""
+        post = self.create_post('Удаляемый')
+        name = post.image.name
+        storage = post.image.storage
+        post.delete()
+        call_command('collect_image_blobs', stdout=StringIO())
+        self.assertTrue(storage.exists(name))
+        call_command('collect_image_blobs', grace=-1, stdout=StringIO())
+        self.assertFalse(storage.exists(name))
+        self.assertFalse(ImageBlob.objects.filter(name=name).exists())
+
+    def test_touched_file_survives_collection(self):
+        """Файл, который снова загружают, сборщик не трогает."""
+        post = self.create_post('Удаляемый')
+        name = post.image.name
+        storage = post.image.storage
+        post.delete()
+        ImageBlob.objects.filter(name=name).update(
+            updated_at=timezone.now() - timedelta(days=1))
+        ImageBlob.objects.touch(name)
+        call_command('collect_image_blobs', stdout=StringIO())
+        self.assertTrue(storage.exists(name))
+
+    def test_upload_after_collection_writes_file_again(self):
+        """Та же картинка после сборки мусора записывается заново."""
+        post = self.create_post('Первый')
+        name = post.image.name
+        post.delete()
+        call_command('collect_image_blobs', grace=-1, stdout=StringIO())
+        again = self.create_post('Второй')
+        self.assertEqual(again.image.name, name)
+        self.assertTrue(again.image.storage.exists(name))
+        self.assertEqual(ImageBlob.objects.get(name=name).references, 1)
@@ -1,10 +1,20 @@
+import time
+from http import HTTPStatus
+
 from django import forms
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
 from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from yatube.settings import POSTS_PER_PAGE, POSTS_PER_PAGE_TEST
+from django.utils.http import http_date
+from yatube.settings import (
+    COMMENTS_PER_PAGE, POSTS_PER_PAGE, POSTS_PER_PAGE_TEST
+)
 
-from posts.models import Group, Post, Comment
+from posts import feed_cache
+from posts.models import Group, Post, Comment, Follow
 
 
 User = get_user_model()
@@ -195,3 +205,133 @@ class PaginatorViewsTest(TestCase):
                 response = self.client.get(reverse_page + '?page=2')
                 self.assertEqual(
                     len(response.context['page_obj']), POSTS_PER_PAGE_TEST)
+
+
+class FeedQueriesTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='feed_author')
+        cls.follower = User.objects.create_user(username='feed_reader')
+        cls.group = Group.objects.create(
+            title='Лента',
+            description='Описание',
+            slug='feed_slug'
+        )
+        Follow.objects.create(user=cls.follower, author=cls.user)
+        cls.pages = [
+            reverse('posts:index'),
+            reverse('posts:profile', kwargs={'username': cls.user}),
+            reverse('posts:group_list', kwargs={'slug': cls.group.slug}),
+            reverse('posts:follow_index'),
+        ]
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.follower)
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.authorized_client.get(url)
+        return len(queries)
+
+    def test_feed_queries_do_not_depend_on_page_size(self):
+        """Число запросов ленты не зависит от числа постов на странице."""
+        Post.objects.create(author=self.user, text='Пост', group=self.group)
+        expected = {url: self.count_queries(url) for url in self.pages}
+        Post.objects.bulk_create(
+            Post(author=self.user, text='Пост', group=self.group)
+            for _ in range(POSTS_PER_PAGE)
+        )
+        for url in self.pages:
+            with self.subTest(url=url):
+                self.assertEqual(self.count_queries(url), expected[url])
+
+
+class ConditionalGetTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='etag_author')
+        self.post = Post.objects.create(author=self.user, text='Пост')
+        self.guest_client = Client()
+
+    def test_unchanged_feed_answers_not_modified(self):
+        """Неизменная лента отвечает 304 без запросов к базе."""
+        url = reverse('posts:index')
+        etag = self.guest_client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        Post.objects.create(author=self.user, text='Новый пост')
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_post_detail_validators(self):
+        """Страница поста сверяет ETag одним запросом."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        response = self.guest_client.get(url)
+        etag = response['ETag']
+        self.assertFalse(response.has_header('Last-Modified'))
+        # Сбрасывается только кэш ответов: счётчики в ETag остаются.
+        feed_cache.bump('responses')
+        with self.assertNumQueries(1):
+            response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        self.post.comments.create(author=self.user, text='Комментарий')
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_post_detail_ignores_if_modified_since(self):
+        """Новый пост автора меняет счётчик на странице: 304 не будет."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        self.guest_client.get(url)
+        Post.objects.create(author=self.user, text='Ещё пост')
+        response = self.guest_client.get(
+            url, HTTP_IF_MODIFIED_SINCE=http_date(time.time() + 60))
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+
+class CommentsPaginationTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='commentator')
+        cls.post = Post.objects.create(author=cls.user, text='Пост')
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.user, text=f'Комментарий {i}')
+            for i in range(COMMENTS_PER_PAGE + 5)
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_post_detail_shows_first_comments_page(self):
+        """На странице поста только первая страница комментариев."""
+        response = self.guest_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}))
+        comments = response.context['comments']
+        self.assertEqual(len(comments), COMMENTS_PER_PAGE)
+        self.assertTrue(comments.has_next())
+        self.assertContains(
+            response, reverse('posts:comments', args=[self.post.pk]))
+
+    def test_comments_fragment_returns_next_batch(self):
+        """Фрагмент комментариев отдаёт следующую пачку по курсору."""
+        first = self.guest_client.get(
+            reverse('posts:comments', kwargs={'post_id': self.post.pk}))
+        page = first.context['comments']
+        cursor = page.paginator.next_cursor(page)
+        response = self.guest_client.get(
+            reverse('posts:comments', kwargs={'post_id': self.post.pk}),
+            {'cursor': cursor},
+        )
+        comments = response.context['comments']
+        self.assertEqual(len(comments), 5)
+        self.assertFalse(comments.has_next())
+        self.assertEqual(
+            {c.pk for c in page} & {c.pk for c in comments}, set())
@@ -0,0 +1,276 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+from PIL import Image
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.base import EXTENSIONS
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores import cached_db_kvstore
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore
+
+from . import feed_cache
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+# Основное превью поста: его шаблоны выводят в src, пока остальные
+# варианты ещё не готовы.
+POST_THUMBNAIL = ('960x339', {'crop': 'center', 'upscale': True})
+
+# Форматы вариантов, кроме JPEG: только те, что умеют и Pillow, и sorl.
+MIME_TYPES = {'JPEG': 'image/jpeg', 'WEBP': 'image/webp', 'AVIF': 'image/avif'}
+
+
+def variant_formats():
+    Image.init()
+    return ['JPEG'] + [
+        image_format for image_format in ('AVIF', 'WEBP')
+        if image_format in Image.SAVE and image_format in EXTENSIONS
+    ]
+
+
+def geometry_size(geometry):
+    return tuple(map(int, geometry.split('x')))
+
+
+def variant_geometry(width):
+    base_width, base_height = geometry_size(POST_THUMBNAIL[0])
+    return f'{width}x{round(width * base_height / base_width)}'
+
+
+# Все превью поста: основное и варианты ширин и форматов для srcset.
+POST_THUMBNAILS = (POST_THUMBNAIL,) + tuple(
+    (variant_geometry(width), {**POST_THUMBNAIL[1], 'format': image_format})
+    for image_format in variant_formats()
+    for width in settings.POST_THUMBNAIL_WIDTHS
+    if (variant_geometry(width), image_format) != (POST_THUMBNAIL[0], 'JPEG')
+)
+
+_executor = None
+_pending = set()
+_lock = threading.Lock()
+
+
+def executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+    return _executor
+
+
+def thumbnail_options(source, options):
+    """Опции превью, дополненные так же, как это делает sorl."""
+    backend = default.backend
+    options = dict(options)
+    if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(thumbnail_settings, attr)
+        if value != getattr(default_settings, attr):
+            options.setdefault(key, value)
+    return options
+
+
+def thumbnail_name(file_, geometry, **options):
+    # Превью считаются от имени файла в хранилище sorl, как в generate():
+    # так ключ не зависит от хранилища, через которое поле сохранило файл.
+    source = ImageFile(getattr(file_, 'name', file_))
+    options = thumbnail_options(source, options)
+    return default.backend._get_thumbnail_filename(source, geometry, options)
+
+
+def cached_thumbnail(file_, geometry, prefetched=None, **options):
+    """
+    Готовое превью из хранилища ключей sorl или None, без генерации.
+
+    `prefetched` — результат prefetch() для страницы: если превью в нём
+    есть, хранилище ключей не трогается.
+    """
+    name = thumbnail_name(file_, geometry, **options)
+    if prefetched is not None and name in prefetched:
+        return prefetched[name]
+    return lookup([name])[name]
+
+
+def prefetch(images):
+    """
+    Превью POST_THUMBNAILS для всех картинок страницы.
+
+    Вместо запроса на каждую карточку — один get_many к кэшу sorl и
+    один запрос к таблице хранилища ключей для промахов.
+    """
+    return lookup([
+        thumbnail_name(image, geometry, **options)
+        for image in images if image
+        for geometry, options in POST_THUMBNAILS
+    ])
+
+
+def lookup(names):
+    """
+    Превью по именам файлов: ImageFile или None, если его ещё нет.
+
+    В отличие от sorl, отсутствие превью кэшируется лишь на
+    THUMBNAIL_MISS_TIMEOUT: превью готовит другой процесс, и закэшированный
+    надолго промах в этом процессе показывал бы заглушку и дальше.
+    """
+    kvstore = default.kvstore
+    if not isinstance(kvstore, cached_db_kvstore.KVStore):
+        return {
+            name: kvstore.get(ImageFile(name, default.storage))
+            for name in names
+        }
+    keys = {
+        add_prefix(ImageFile(name, default.storage).key): name
+        for name in names
+    }
+    values = kvstore.cache.get_many(keys)
+    missing = [key for key in keys if key not in values]
+    if missing:
+        found = dict(
+            KVStore.objects.filter(key__in=missing).values_list(
+                'key', 'value')
+        )
+        kvstore.cache.set_many(
+            found, thumbnail_settings.THUMBNAIL_CACHE_TIMEOUT)
+        kvstore.cache.set_many(
+            {
+                key: cached_db_kvstore.EMPTY_VALUE
+                for key in missing if key not in found
+            },
+            settings.THUMBNAIL_MISS_TIMEOUT,
+        )
+        values.update(found)
+    return {
+        name: (deserialize_image_file(values[key])
+               if values.get(key, cached_db_kvstore.EMPTY_VALUE)
+               != cached_db_kvstore.EMPTY_VALUE else None)
+        for key, name in keys.items()
+    }
+
+
+def schedule(name):
+    """Ставит генерацию всех превью картинки в очередь пула."""
+    if not settings.THUMBNAIL_WORKERS:
+        generate(name)
+        return
+    with _lock:
+        if name in _pending:
+            return
+        _pending.add(name)
+    executor().submit(work, name)
+
+
+def work(name):
+    try:
+        generate(name)
+    finally:
+        with _lock:
+            _pending.discard(name)
+        connections.close_all()
+
+
+def ready(name):
+    """Все ли превью картинки уже есть в хранилище ключей sorl."""
+    return all(
+        cached_thumbnail(name, geometry, **options)
+        for geometry, options in POST_THUMBNAILS
+    )
+
+
+def render(name):
+    """Готовит все превью картинки; True, если все они есть в sorl."""
+    try:
+        for geometry, options in POST_THUMBNAILS:
+            get_thumbnail(name, geometry, **options)
+        return ready(name)
+    except Exception:
+        logger.exception('Не удалось подготовить превью %s', name)
+        return False
+
+
+def generate(name):
+    """
+    Готовит превью картинки и сбрасывает кэши её постов.
+
+    Если превью уже были (правка текста, повторная загрузка той же
+    картинки), кэши не трогаются.
+    """
+    if ready(name):
+        return
+    if render(name):
+        expire_posts(name)
+
+
+def expire_posts(name):
+    """Страницы постов с картинкой: вместо заглушки появилось превью."""
+    posts = Post.objects.filter(image=name)
+    # Новое время изменения меняет ключи карточек и валидаторы
+    # условного GET у самих постов.
+    posts.update(updated_at=timezone.now())
+    feed_cache.bump('responses')
+    feed_cache.bump('index')
+    feeds = posts.order_by().values_list(
+        'author__username', 'group__slug').distinct()
+    for username, slug in feeds:
+        feed_cache.bump('profile', username)
+        if slug is not None:
+            feed_cache.bump('group', slug)
+
+
+def variants(post, prefetched=None):
+    """
+    Превью картинки поста для шаблона: src, srcset по форматам и размеры.
+
+    Варианты шире исходной картинки (если её ширина известна) не
+    выводятся. Читается только хранилище ключей (или prefetched),
+    файловая система не трогается; пока основного превью нет, src — None.
+    """
+    width, height = geometry_size(POST_THUMBNAIL[0])
+    result = {
+        'src': None,
+        'width': width,
+        'height': height,
+        'srcset': '',
+        'sources': [],
+        'sizes': settings.POST_THUMBNAIL_SIZES,
+    }
+    main = cached_thumbnail(
+        post.image, POST_THUMBNAIL[0], prefetched=prefetched,
+        **POST_THUMBNAIL[1])
+    if main is None:
+        return result
+    max_width = max(post.image_width or 0, width)
+    srcsets = {}
+    for geometry, options in POST_THUMBNAILS:
+        if post.image_width and geometry_size(geometry)[0] > max_width:
+            continue
+        thumbnail = main if (geometry, options) == POST_THUMBNAIL else (
+            cached_thumbnail(
+                post.image, geometry, prefetched=prefetched, **options))
+        if thumbnail is not None:
+            image_format = options.get('format', 'JPEG')
+            srcsets.setdefault(image_format, []).append(
+                f'{thumbnail.url} {thumbnail.width}w')
+    result.update(
+        src=main.url,
+        srcset=', '.join(srcsets.pop('JPEG', [])),
+        sources=[
+            {'type': MIME_TYPES[image_format], 'srcset': ', '.join(srcset)}
+            for image_format, srcset in srcsets.items()
+        ],
+    )
+    return result
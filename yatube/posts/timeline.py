@@ -0,0 +1,197 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F, OuterRef, Q, Subquery
+
+from .models import Follow, Post, TimelineEntry, UserStats
+
+RECENT_POSTS_KEY = 'timeline:recent:{}'
+
+
+def feed(user):
+    """
+    Лента подписок: разложенный таймлайн плюс свежие посты авторов,
+    которых не раскладывают из-за числа подписчиков (см. is_pulled).
+    """
+    posts = Post.objects.for_feed()
+    pulled = pulled_post_ids(user)
+    if not pulled:
+        return posts.timeline(user)
+    pushed = TimelineEntry.objects.filter(user=user).values('post_id')
+    return posts.filter(Q(pk__in=pushed) | Q(pk__in=pulled)).annotate(
+        timeline_date=F('pub_date'),
+        timeline_post=F('id'),
+    )
+
+
+def is_pulled(author_id):
+    """Посты автора с большим числом подписчиков читаются при показе."""
+    return UserStats.objects.filter(
+        user_id=author_id,
+        followers_count__gt=settings.TIMELINE_FANOUT_MAX_FOLLOWERS,
+    ).exists()
+
+
+def pulled_post_ids(user):
+    authors = Follow.objects.filter(
+        user=user,
+        author__stats__followers_count__gt=(
+            settings.TIMELINE_FANOUT_MAX_FOLLOWERS),
+    ).values_list('author_id', flat=True)
+    return recent_post_ids(list(authors))
+
+
+def recent_post_ids(author_ids):
+    """Последние TIMELINE_PULL_DEPTH постов каждого автора из кэша."""
+    keys = {RECENT_POSTS_KEY.format(pk): pk for pk in author_ids}
+    recent = cache.get_many(keys)
+    missing = {
+        key: list(
+            Post.objects.filter(author_id=author_id).order_by(
+                '-pub_date', '-id'
+            ).values_list('pk', flat=True)[:settings.TIMELINE_PULL_DEPTH]
+        )
+        for key, author_id in keys.items() if key not in recent
+    }
+    if missing:
+        cache.set_many(missing, None)
+        recent.update(missing)
+    return [pk for post_ids in recent.values() for pk in post_ids]
+
+
+def forget_recent(author_id):
+    cache.delete(RECENT_POSTS_KEY.format(author_id))
+
+
+def fan_out(post):
+    """Раскладывает новый пост по лентам подписчиков автора пачками."""
+    if is_pulled(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).order_by('user_id').values_list('user_id', flat=True)
+    batch = []
+    for user_id in followers.iterator(
+            chunk_size=settings.TIMELINE_BATCH_SIZE):
+        batch.append(user_id)
+        if len(batch) == settings.TIMELINE_BATCH_SIZE:
+            push(post, batch)
+            batch = []
+    if batch:
+        push(post, batch)
+
+
+def push(post, user_ids):
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(
+                user_id=user_id,
+                post_id=post.pk,
+                author_id=post.author_id,
+                pub_date=post.pub_date,
+            )
+            for user_id in user_ids
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту свежие посты автора, на которого подписались."""
+    if is_pulled(author_id):
+        return
+    posts = Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date', '-id'
+    ).values_list('pk', 'pub_date')[:settings.TIMELINE_MAX_ENTRIES]
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(
+                user_id=user_id,
+                post_id=post_id,
+                author_id=author_id,
+                pub_date=pub_date,
+            )
+            for post_id, pub_date in posts
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def prune(user_id, author_id):
+    """Убирает из ленты посты автора, от которого отписались."""
+    TimelineEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def overflowing():
+    """Пользователи, в лентах которых больше TIMELINE_MAX_ENTRIES записей."""
+    return TimelineEntry.objects.order_by().values('user_id').annotate(
+        total=Count('pk')
+    ).filter(
+        total__gt=settings.TIMELINE_MAX_ENTRIES
+    ).order_by('user_id').values_list('user_id', flat=True)
+
+
+def trim(user_ids):
+    """
+    Оставляет в лентах не больше TIMELINE_MAX_ENTRIES записей.
+
+    Все ленты обрезаются одним DELETE по границе — дате последней
+    хранимой записи каждой ленты. Обрезку запускает команда
+    trim_timelines, а не публикация поста: между запусками лента
+    может ненадолго оказаться длиннее.
+    """
+    limit = settings.TIMELINE_MAX_ENTRIES
+    cutoff = TimelineEntry.objects.filter(
+        user_id=OuterRef('user_id')
+    ).order_by('-pub_date', '-post_id').values('pub_date')[limit - 1:limit]
+    deleted, _ = TimelineEntry.objects.filter(
+        user_id__in=user_ids, pub_date__lt=Subquery(cutoff)).delete()
+    return deleted
+
+
+def rebuild(author_ids):
+    """
+    Заново раскладывает последние посты авторов по лентам подписчиков.
+
+    Нужна после массовой записи в обход сигналов (bulk_create): посты
+    каждого автора читаются один раз на всех его подписчиков.
+    """
+    for author_id in author_ids:
+        forget_recent(author_id)
+        if is_pulled(author_id):
+            continue
+        posts = list(
+            Post.objects.filter(author_id=author_id).order_by(
+                '-pub_date', '-id'
+            ).values_list('pk', 'pub_date')[:settings.TIMELINE_MAX_ENTRIES]
+        )
+        if not posts:
+            continue
+        followers = Follow.objects.filter(
+            author_id=author_id
+        ).order_by('user_id').values_list('user_id', flat=True)
+        batch = []
+        for user_id in followers.iterator(
+                chunk_size=settings.TIMELINE_BATCH_SIZE):
+            batch.append(user_id)
+            if len(batch) == settings.TIMELINE_BATCH_SIZE:
+                push_posts(author_id, posts, batch)
+                batch = []
+        if batch:
+            push_posts(author_id, posts, batch)
+
+
+def push_posts(author_id, posts, user_ids):
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(
+                user_id=user_id,
+                post_id=post_id,
+                author_id=author_id,
+                pub_date=pub_date,
+            )
+            for user_id in user_ids
+            for post_id, pub_date in posts
+        ),
+        batch_size=settings.TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+
+
+class LimitedUploadHandler(FileUploadHandler):
+    """
+    Отбрасывает файл, как только он превысил POST_IMAGE_MAX_BYTES.
+
+    Проверка идёт по мере приёма данных, поэтому лишнее не пишется ни
+    в память, ни во временный файл. Имена полей с отброшенными файлами
+    остаются в request.oversized_uploads: форма сообщает о них ошибкой.
+    Обработчик должен стоять в FILE_UPLOAD_HANDLERS первым.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.POST_IMAGE_MAX_BYTES:
+            if not hasattr(self.request, 'oversized_uploads'):
+                self.request.oversized_uploads = set()
+            self.request.oversized_uploads.add(self.field_name)
+            raise SkipFile
+        return raw_data
+
+    def file_complete(self, file_size):
+        # Сам файл собирают следующие обработчики.
+        return None
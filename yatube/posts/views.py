@@ -1,44 +1,96 @@
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import Count, Max
 from django.shortcuts import get_object_or_404, redirect, render
-from yatube.settings import POSTS_PER_PAGE
+from django.views.decorators.http import condition
+from yatube.settings import COMMENTS_PER_PAGE, POSTS_PER_PAGE
 
+from . import feed_cache, search, thumbnails, timeline
 from .forms import PostForm, CommentForm
-from .models import Group, Post, Follow, User
+from .models import (TIMELINE_KEYS, Comment, Group, Post, Follow, User,
+                     UserStats)
+from .paginators import KeysetPaginator
 
 
-def paginator_inside(request, post_list):
-    paginator = Paginator(post_list, POSTS_PER_PAGE)
+def paginator_inside(request, post_list, **kwargs):
+    paginator = KeysetPaginator(post_list, POSTS_PER_PAGE, **kwargs)
+    cursor = request.GET.get('cursor')
+    if cursor:
+        return paginator.cursor_page(cursor)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     return page_obj
 
 
+def feed_etag(feed, scope_kwarg=None):
+    """ETag ленты по её счётчику: без запросов к базе и шаблонов."""
+    def etag(request, **kwargs):
+        scope = kwargs[scope_kwarg] if scope_kwarg else ''
+        return feed_cache.etag(request, (feed, scope))
+    return etag
+
+
+def post_validators(request, post_id):
+    """
+    Время изменения поста и сводка комментариев одним запросом.
+
+    Страница поста сверяется только по ETag: от числа постов автора и
+    от группы она зависит без отметки времени, и Last-Modified по
+    одним датам отдавал бы 304 на устаревшую страницу.
+    """
+    if not hasattr(request, 'post_validators'):
+        request.post_validators = Post.objects.filter(
+            pk=post_id
+        ).order_by().annotate(
+            comments_count=Count('comments'),
+            comments_updated_at=Max('comments__updated_at'),
+        ).values_list(
+            'updated_at', 'comments_count', 'comments_updated_at',
+            'author__stats__posts_count',
+        ).first()
+    return request.post_validators
+
+
+def post_etag(request, post_id):
+    validators = post_validators(request, post_id)
+    if validators is None:
+        return None
+    return feed_cache.etag(request, extra=validators)
+
+
+@condition(etag_func=feed_etag('index'))
 def index(request):
-    post_list = Post.objects.all()
-    page_obj = paginator_inside(request, post_list)
+    post_list = Post.objects.for_feed()
+    page_obj = paginator_inside(request, post_list, count_key='index')
     context = {
         'page_obj': page_obj,
+        **feed_cache.cache_context(request, 'index'),
     }
     return render(request, 'posts/index.html', context)
 
 
+@condition(etag_func=feed_etag('group', 'slug'))
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()
-    page_obj = paginator_inside(request, post_list)
+    post_list = group.posts.for_feed()
+    page_obj = paginator_inside(
+        request, post_list, count_key=f'group:{slug}')
     context = {
         'group': group,
         'page_obj': page_obj,
+        **feed_cache.cache_context(request, 'group', slug),
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@condition(etag_func=feed_etag('profile', 'username'))
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    post_list = author.posts.all()
-    page_obj = paginator_inside(request, post_list)
-    sum_count = post_list.count()
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username)
+    post_list = author.posts.for_feed()
+    page_obj = paginator_inside(
+        request, post_list, count_key=f'profile:{username}')
+    sum_count = UserStats.objects.for_user(author).posts_count
     following = request.user.is_authenticated and Follow.objects.filter(
         user=request.user, author=author
     ).exists()
@@ -47,29 +99,55 @@ def profile(request, username):
         'sum_count': sum_count,
         'page_obj': page_obj,
         'following': following,
+        **feed_cache.cache_context(request, 'profile', username),
     }
     return render(request, 'posts/profile.html', context)
 
 
+@condition(etag_func=post_etag)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
-    sum_count = Post.objects.filter(author=post.author).count()
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), pk=post_id)
+    sum_count = UserStats.objects.for_user(post.author).posts_count
     form = CommentForm(request.POST or None)
-    comments = post.comments.all()
     context = {
         'post': post,
         'sum_count': sum_count,
         'form': form,
-        'comments': comments,
+        'comments': comments_page(request, post),
+        # Все варианты превью одним обращением к кэшу, как в лентах.
+        'thumbnails': thumbnails.prefetch([post.image]),
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+def comments_page(request, post):
+    """Страница комментариев по курсору, без COUNT(*) и OFFSET."""
+    paginator = KeysetPaginator(
+        post.comments.select_related('author'),
+        COMMENTS_PER_PAGE,
+        keys=('created', 'id'),
+    )
+    return paginator.cursor_page(request.GET.get('cursor'))
+
+
+@condition(etag_func=post_etag)
+def post_comments(request, post_id):
+    post = get_object_or_404(Post.objects.only('id'), pk=post_id)
+    context = {
+        'post': post,
+        'comments': comments_page(request, post),
+    }
+    return render(request, 'posts/includes/comment_list.html', context)
+
+
 @login_required
+@transaction.atomic
 def post_create(request):
     form = PostForm(
         request.POST or None,
         files=request.FILES or None,
+        oversized_uploads=getattr(request, 'oversized_uploads', None),
     )
     if form.is_valid():
         post = form.save(False)
@@ -87,7 +165,8 @@ def post_edit(request, post_id):
     form = PostForm(
         request.POST or None,
         files=request.FILES or None,
-        instance=post
+        instance=post,
+        oversized_uploads=getattr(request, 'oversized_uploads', None),
     )
     if form.is_valid():
         form.save()
@@ -97,6 +176,7 @@ def post_edit(request, post_id):
 
 
 @login_required
+@transaction.atomic
 def add_comment(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
     form = CommentForm(request.POST or None)
@@ -108,12 +188,33 @@ def add_comment(request, post_id):
     return redirect('posts:post_detail', post_id=post_id)
 
 
+def post_search(request):
+    """
+    Посты по полнотекстовому запросу, самые релевантные первыми.
+
+    Находятся и посты, под запрос к которым подходят комментарии.
+    """
+    query = request.GET.get('q', '').strip()
+    page_obj = None
+    if query:
+        post_list = search.ranked(
+            Post.objects.for_feed(), query,
+            also=((Comment.objects.all(), 'post'),))
+        paginator = KeysetPaginator(
+            post_list, POSTS_PER_PAGE, keys=('search_rank', 'id'))
+        page_obj = paginator.cursor_page(request.GET.get('cursor'))
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
 def follow_index(request):
-    user_follows = Follow.objects.filter(user=request.user).values('author')
-    following_authors = Post.objects.filter(
-        author_id__in=user_follows)
-    page_obj = paginator_inside(request, following_authors)
+    following_authors = timeline.feed(request.user)
+    page_obj = paginator_inside(
+        request, following_authors, keys=TIMELINE_KEYS)
     context = {
         'page_obj': page_obj,
     }
@@ -121,6 +222,7 @@ def follow_index(request):
 
 
 @login_required
+@transaction.atomic
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     if author == request.user:
@@ -133,6 +235,7 @@ def profile_follow(request, username):
 
 
 @login_required
+@transaction.atomic
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     Follow.objects.filter(user=request.user,
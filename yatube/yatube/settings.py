@@ -50,6 +50,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'django.middleware.http.ConditionalGetMiddleware',
+    'posts.middleware.AnonymousCacheMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -131,6 +133,18 @@ STATIC_URL = '/static/'
 
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static'), ]
 
+STATIC_ROOT = os.path.join(BASE_DIR, 'collected_static')
+
+# В продакшене имена файлов статики содержат хэш содержимого, а рядом
+# с текстовыми файлами лежат сжатые копии .gz и .br.
+if not DEBUG:
+    STATICFILES_STORAGE = 'core.storage.CompressedManifestStaticFilesStorage'
+
+# Отдавать собранную статику самим приложением, если перед ним нет CDN
+# или веб-сервера. Файлы без хэша в имени кэшируются на STATIC_MAX_AGE.
+SERVE_STATIC = False
+STATIC_MAX_AGE = 60 * 60
+
 LOGIN_URL = 'users:login'
 
 LOGIN_REDIRECT_URL = 'posts:index'
@@ -143,14 +157,122 @@ POSTS_PER_PAGE = 10
 
 POSTS_PER_PAGE_TEST = 3
 
+# Сколько комментариев показывается под постом за один раз.
+COMMENTS_PER_PAGE = 20
+
+# Сколько первых страниц ленты доступно по номеру ?page=N;
+# дальше пагинатор переходит на курсоры ?cursor=.
+PAGINATOR_MAX_PAGE_NUMBER = 10
+
+# Как долго хранится число записей ленты между пересчётами и с какого
+# числа оно показывается приблизительно («около N»).
+PAGINATOR_COUNT_TIMEOUT = 60 * 5
+PAGINATOR_APPROXIMATE_COUNT = 1000
+
+# До скольки записей списки админки считаются точно.
+ADMIN_COUNT_LIMIT = 10000
+
+# Сколько записей хранится в ленте подписок одного пользователя. Ленты
+# обрезает периодическая команда trim_timelines, а не публикация поста.
+TIMELINE_MAX_ENTRIES = 1000
+
+# Размер пачки при раскладке поста по лентам подписчиков.
+TIMELINE_BATCH_SIZE = 500
+
+# Посты авторов, у которых подписчиков больше порога, не раскладываются
+# по лентам, а подмешиваются при чтении: по TIMELINE_PULL_DEPTH
+# последних постов каждого такого автора.
+TIMELINE_FANOUT_MAX_FOLLOWERS = 10000
+
+TIMELINE_PULL_DEPTH = 100
+
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
 MEDIA_URL = '/media/'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+# Как отдаются загруженные файлы: None — самим приложением,
+# 'x-accel-redirect' — через nginx из внутреннего location
+# MEDIA_ACCEL_PREFIX, 'x-sendfile' — через Apache или lighttpd.
+MEDIA_SENDFILE = None
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+
+# Имена картинок и превью содержат хэш содержимого, поэтому их можно
+# кэшировать в браузере надолго.
+MEDIA_MAX_AGE = 60 * 60 * 24 * 30
+
+# Срок кэша страниц лент. Устаревшие страницы отсекаются версией ленты,
+# поэтому срок может быть длинным.
+FEED_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Ответы, которые целиком кэшируются для анонимных пользователей.
+RESPONSE_CACHE_VIEWS = (
+    'posts:index',
+    'posts:group_list',
+    'posts:profile',
+    'posts:post_detail',
+    'posts:comments',
+)
+RESPONSE_CACHE_TIMEOUT = 60 * 60
+
+# Срок кэша карточек постов: ключ карточки меняется вместе с постом.
+POST_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Потоков, которые готовят превью картинок после сохранения поста.
+# При 0 превью готовятся сразу после коммита в том же потоке: так
+# при разработке и в тестах файлы не пишутся в фоне после ответа.
+THUMBNAIL_WORKERS = 0 if DEBUG else 2
+
+# Сколько секунд процесс помнит, что превью ещё нет. Превью готовят
+# другие процессы, поэтому долго кэшировать промах нельзя.
+THUMBNAIL_MISS_TIMEOUT = 5
+
+# Бюджет загружаемой картинки поста и наибольшая сторона, до которой
+# она уменьшается перед сохранением.
+POST_IMAGE_MAX_BYTES = 10 * 2 ** 20
+POST_IMAGE_MAX_PIXELS = 50 * 10 ** 6
+POST_IMAGE_MAX_SIDE = 2560
+POST_IMAGE_JPEG_QUALITY = 85
+
+# Файл больше POST_IMAGE_MAX_BYTES отбрасывается ещё при приёме.
+FILE_UPLOAD_HANDLERS = [
+    'posts.uploadhandlers.LimitedUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
+# Ширины вариантов превью поста для srcset и атрибут sizes к ним.
+POST_THUMBNAIL_WIDTHS = (480, 960, 1440)
+POST_THUMBNAIL_SIZES = '(min-width: 992px) 960px, 100vw'
+
+# Словарь PostgreSQL для полнотекстового поиска по постам и комментариям.
+SEARCH_CONFIG = 'russian'
+
+# Кэш должен быть общим для всех процессов: в нём лежат счётчики лент,
+# по которым процессы узнают об изменениях. Кэш в памяти процесса
+# годится только для разработки; если серверов несколько, файловый кэш
+# нужно заменить на memcached или redis. Проверка posts.E001
+# в manage.py check --deploy не пропустит LocMemCache с долгими сроками.
+if DEBUG:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.path.join(BASE_DIR, 'cache'),
+            # По умолчанию файловый кэш держит лишь 300 записей и при
+            # переполнении стирает треть. Здесь места хватает на карточки,
+            # страницы лент и превью; при переполнении стирается десятая
+            # часть, а вытесненные счётчики лент начинаются заново
+            # (см. feed_cache.initial_generation).
+            'OPTIONS': {
+                'MAX_ENTRIES': 100000,
+                'CULL_FREQUENCY': 10,
+            },
+        }
     }
-}
@@ -13,11 +13,14 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import re
+
 from django.contrib import admin
-from django.urls import path
+from django.urls import path, re_path
 from django.urls.conf import include
 from django.conf import settings
-from django.conf.urls.static import static
+
+from core.views import media_file, static_file
 
 
 handler500 = 'core.views.server_error'
@@ -32,7 +35,13 @@ urlpatterns = [
     path('admin/', admin.site.urls),
 ]
 
-if settings.DEBUG:
-    urlpatterns += static(
-        settings.MEDIA_URL, document_root=settings.MEDIA_ROOT
-    )
+media_prefix = re.escape(settings.MEDIA_URL.lstrip('/'))
+urlpatterns += [
+    re_path(rf'^{media_prefix}(?P<path>.*)$', media_file),
+]
+
+if settings.SERVE_STATIC:
+    static_prefix = re.escape(settings.STATIC_URL.lstrip('/'))
+    urlpatterns += [
+        re_path(rf'^{static_prefix}(?P<path>.*)$', static_file),
+    ]